@@ -1,8 +1,8 @@
-from multiprocessing import Queue, Process, Event
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import Event
 from main import WarehouseController
 import gymnasium as gym
-import io
-import contextlib
 
 # Sample predefined environments
 settings = [
@@ -14,8 +14,10 @@ settings = [
 
 stop_event = Event()
 
-def run_simulation(env_name, log_queue):
-    
+def run_simulation(env_name):
+    """Run one setting to completion and return its formatted summary"""
+    print(f"Running simulation for: {env_name}")
+
     # Initialize environment and controller
     env = gym.make(env_name)
     controller = WarehouseController(env)
@@ -26,7 +28,7 @@ def run_simulation(env_name, log_queue):
     step = 0
     try:
         while not stop_event.is_set():
-            if controller.metrics.get_successful_tasks().count >= max_deliveries:
+            if controller.metrics.successful_deliveries >= max_deliveries:
                 print(f"\nAll {max_deliveries} deliveries completed! Simulation ending.")
                 break
 
@@ -38,36 +40,27 @@ def run_simulation(env_name, log_queue):
             controller.current_step = step
             step += 1
     finally:
-        
-
-        with io.StringIO() as buf, contextlib.redirect_stdout(buf):
-            controller.metrics.print_summary()
-            summary = buf.getvalue()
-        log_queue.put(f"=== {env_name} ===\n{summary}\n")
-
-
+        summary = controller.metrics.format_summary()
         env.close()
         del env
 
-def save_summary_to_file(log_queue):
+    return f"=== {env_name} ===\n{summary}\n"
+
+def save_summary_to_file(summaries):
     with open("simulation_astar.txt", "w") as file:
-        while not log_queue.empty():
-            summary = log_queue.get_nowait()
+        for summary in summaries:
             file.write(summary + "\n")
 
 def automate_simulation():
-    log_queue = Queue()
-
-    for env_name in settings:
-        print(f"Running simulation for: {env_name}")
+    # The runs share no state, so they execute side by side, one worker per core at most
+    max_workers = min(len(settings), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(run_simulation, env_name) for env_name in settings]
+        # Collect in submission order so the file lists settings in order; re-raises worker errors
+        summaries = [future.result() for future in futures]
 
-        # Run the simulation process for the current environment
-        sim_process = Process(target=run_simulation, args=(env_name, log_queue))
-        sim_process.start()
-        sim_process.join()  # Wait for the process to finish before proceeding to the next one
-    
     # Save all collected summaries to a file
-    save_summary_to_file(log_queue)
+    save_summary_to_file(summaries)
 
 if __name__ == "__main__":
     automate_simulation()
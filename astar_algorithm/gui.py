@@ -1,13 +1,11 @@
-import tkinter as tk
-from tkinter import ttk
-from multiprocessing import Process, Event
+import multiprocessing
+import queue
 import sys
-from main import WarehouseController
-import rware
-from rware.warehouse import RewardType, Warehouse
-import gymnasium as gym
 import time
 
+# tkinter, gymnasium, rware and the controller are imported where they are used,
+# so a spawned simulation process only pays for what it actually needs
+
 
 settings = [
     "rware-rl",
@@ -17,41 +15,120 @@ settings = [
     "rware-cond4-v2",
 ]
 
-stop_event = Event()
+MAX_LOG_LINES = 5000
+TRIM_EVERY_INSERTS = 50
+WRITE_BUFFER_SIZE = 4096
+IDLE_POLL_MS = 250  # Poll interval while the log queue is quiet
+STOP_TIMEOUT_MS = 3000  # Grace period before a stuck worker is terminated
+
+# Environments built by this process, keyed by their spec
+_env_cache = {}
+
+
+def _spec_key(env_spec):
+    """Hashable cache key for an env spec dict"""
+    if env_spec["kind"] == "predefined":
+        return ("predefined", env_spec["id"])
+    return ("custom",) + tuple(
+        (name, tuple(value) if isinstance(value, list) else value)
+        for name, value in sorted(env_spec["params"].items())
+    )
+
+
+def _get_env(env_spec):
+    """Build the environment described by env_spec, reusing a cached one if possible"""
+    key = _spec_key(env_spec)
+    if key not in _env_cache:
+        if env_spec["kind"] == "predefined":
+            import gymnasium as gym
+            import rware  # registers the predefined environments
+            env = gym.make(env_spec["id"])
+        else:
+            from rware.warehouse import Warehouse
+            env = Warehouse(**env_spec["params"])
+        _env_cache[key] = env
+    return _env_cache[key]
+
+
+def _render_loop(env, controller, actions, stop_flag, max_deliveries, sleep_time):
+    """Step, render and pace the simulation until it is stopped or done"""
+    step = 0
+    # sleep_time is passed once per start command, so it is constant for the run
+    next_deadline = time.monotonic()
+    while not stop_flag.value:
+        if controller.metrics.successful_deliveries >= max_deliveries:
+            print(f"\nAll {max_deliveries} deliveries completed! Simulation ending.")
+            break
+
+        controller.get_actions(out=actions)
+        env.step(actions)
+        env.render()
+        # Sleep only for what is left of this frame; drop the wait if late
+        now = time.monotonic()
+        if now < next_deadline:
+            time.sleep(next_deadline - now)
+        next_deadline = max(next_deadline + sleep_time, now)
+
+        controller.current_step = step
+        step += 1
+
+
+def _headless_loop(env, controller, actions, stop_flag, max_deliveries, sleep_time):
+    """Step the simulation as fast as possible, without rendering or pacing"""
+    step = 0
+    while not stop_flag.value:
+        if controller.metrics.successful_deliveries >= max_deliveries:
+            print(f"\nAll {max_deliveries} deliveries completed! Simulation ending.")
+            break
+
+        controller.get_actions(out=actions)
+        env.step(actions)
+
+        controller.current_step = step
+        step += 1
+
 
 # Define the custom environment setup
-def run_simulation(env, log_queue, render_enabled=True, sleep_time=0.1, max_deliveries=50):
-    controller = WarehouseController(env)
+def run_simulation(env_spec, log_queue, stop_flag, render_enabled=True, sleep_time=0.1, max_deliveries=50):
+    import numpy as np
+    from main import WarehouseController
+
+    # A spawned child does not inherit the GUI's stdout redirection
+    sys.stdout = sys.stderr = TextRedirector(None, log_queue)
+
+    env = _get_env(env_spec)
+    controller = WarehouseController(env, verbose=True)
     obs, info = env.reset()
     controller.initialize_and_verify(env)
 
-    step = 0
+    # Reused every step instead of allocating a fresh action list
+    actions = np.empty(env.unwrapped.n_agents, dtype=np.int8)
+    loop = _render_loop if render_enabled else _headless_loop
     try:
-        while not stop_event.is_set():
-            if controller.metrics.get_successful_tasks().count >= max_deliveries:
-                print(f"\nAll {max_deliveries} deliveries completed! Simulation ending.")
-                break
-
-            actions = controller.get_actions()
-            obs, rewards, done, truncated, info = env.step(actions)
-            
-            if render_enabled:
-                env.render()
-                time.sleep(sleep_time)
-
-            controller.current_step = step
-            step += 1
+        loop(env, controller, actions, stop_flag, max_deliveries, sleep_time)
     finally:
-        import io
-        import contextlib
+        sys.stdout.flush()
+        log_queue.put(controller.metrics.format_summary())
 
-        with io.StringIO() as buf, contextlib.redirect_stdout(buf):
-            controller.metrics.print_summary()
-            summary = buf.getvalue()
-        log_queue.put(summary)
+        env.close()  # Closes the viewer; the env itself stays cached for reuse
 
-        env.close()  # This should now call the custom close method
-        del env
+
+def _worker_main(cmd_queue, log_queue, stop_flag, running_event):
+    """Long-lived simulation process: runs one simulation per start command"""
+    while True:
+        command = cmd_queue.get()
+        if command["cmd"] == "quit":
+            break
+        if command["cmd"] == "start":
+            try:
+                run_simulation(
+                    command["spec"], log_queue, stop_flag, command["render"],
+                    command["sleep_time"], command["max_deliveries"]
+                )
+            except Exception as e:
+                log_queue.put(f"Simulation failed: {e!r}\n")
+            finally:
+                running_event.clear()
 
 
 class TextRedirector:
@@ -59,25 +136,64 @@ class TextRedirector:
         self.text_widget = text_widget
         self.tag = tag
         self.queue = log_queue
+        self._buf = []
+        self._buflen = 0
+        self._inserts = 0
 
     def write(self, str):
-        self.queue.put(str)
+        # Buffer until a full line (or enough text) is available, so each
+        # print() costs one queue put instead of one per fragment
+        self._buf.append(str)
+        self._buflen += len(str)
+        if '\n' in str or self._buflen >= WRITE_BUFFER_SIZE:
+            self._flush()
+
+    def _flush(self):
+        if self._buf:
+            self.queue.put(''.join(self._buf))
+            self._buf.clear()
+            self._buflen = 0
 
     def flush(self):
-        pass
+        self._flush()
 
     def update_widget(self):
-        while not self.queue.empty():
-            msg = self.queue.get_nowait()
+        # Drain everything queued since the last tick and insert it in one go,
+        # so the widget is touched once per tick instead of once per message
+        msgs = []
+        try:
+            while True:
+                msgs.append(self.queue.get_nowait())
+        except queue.Empty:
+            pass
+
+        if msgs:
+            # Only follow the output if the user has not scrolled back
+            at_bottom = self.text_widget.yview()[1] > 0.98
             self.text_widget.configure(state='normal')
-            self.text_widget.insert(tk.END, msg, (self.tag,))
-            self.text_widget.see(tk.END)
+            self.text_widget.insert('end', ''.join(msgs), (self.tag,))
+            # Keep the log bounded so inserts stay cheap on long runs
+            self._inserts += 1
+            if self._inserts % TRIM_EVERY_INSERTS == 0:
+                self.text_widget.delete(1.0, f"end-{MAX_LOG_LINES}lines")
+            if at_bottom:
+                self.text_widget.see('end')
             self.text_widget.configure(state='disabled')
+        return bool(msgs)
 
 
 def gui():
-    from multiprocessing import Queue
-    log_queue = Queue()
+    import tkinter as tk
+    from tkinter import ttk
+    from rware.warehouse import RewardType
+
+    # Every helper process is spawned, whatever the platform default is; the
+    # worker then starts from a fresh interpreter that only imports what it uses
+    ctx = multiprocessing.get_context("spawn")
+
+    # Manager-backed queue; ``manager`` must stay referenced for the GUI's lifetime
+    manager = ctx.Manager()
+    log_queue = manager.Queue()
 
     root = tk.Tk()
     root.title("Robotic Warehouse Simulator")
@@ -201,21 +317,49 @@ def gui():
             env_menu.pack_forget()
             custom_frame.pack(pady=(10, 15))
 
-    global sim_process
-    sim_process = None
-    stop_event = Event()
+    cmd_queue = manager.Queue()
+    # Plain shared byte: the simulation loop reads it every step without locking
+    stop_flag = ctx.Value('b', 0, lock=False)
+    running_event = ctx.Event()  # Set while the worker is busy with a simulation
+
+    def spawn_worker():
+        process = ctx.Process(
+            target=_worker_main,
+            args=(cmd_queue, log_queue, stop_flag, running_event),
+            daemon=True,
+        )
+        process.start()
+        return process
+
+    worker = spawn_worker()
+    watchdog_id = None  # Pending stop_watchdog callback, cancelled when no longer wanted
+
+    def cancel_watchdog():
+        nonlocal watchdog_id
+        if watchdog_id is not None:
+            root.after_cancel(watchdog_id)
+            watchdog_id = None
 
     def start():
-        global sim_process
-        if sim_process and sim_process.is_alive():
-            return  # already running
+        nonlocal worker
+        if not worker.is_alive():
+            # The worker died without reaching its finally (e.g. a crash in the viewer)
+            running_event.clear()
+            worker = spawn_worker()
+            log_queue.put("Simulation worker exited unexpectedly; restarted it.\n")
+        if running_event.is_set():
+            # Still busy (possibly finishing after Stop; its watchdog stays armed)
+            log_queue.put("A simulation is already running; press Stop first.\n")
+            return
+        # A watchdog left over from the previous run's Stop must not fire against this one
+        cancel_watchdog()
 
         # Clear previous logs
         log_text.configure(state="normal")
         log_text.delete(1.0, tk.END)
         log_text.configure(state="disabled")
 
-        stop_event.clear()
+        stop_flag.value = 0
 
         try:
             max_deliveries = max_deliveries_var.get()
@@ -226,13 +370,7 @@ def gui():
             max_deliveries = 50
 
         if env_type.get() == "predefined":
-            selected_env = env_var.get()
-            env = gym.make(selected_env)
-            sim_process = Process(
-                target=run_simulation, 
-                args=(env, log_queue, render_var.get(), sleep_time_var.get(), max_deliveries)
-            )
-            sim_process.start()
+            env_spec = {"kind": "predefined", "id": env_var.get()}
 
         elif env_type.get() == "custom":
             try:
@@ -243,36 +381,54 @@ def gui():
                 rq_size = int(rq_size_entry.get())
                 agent_capacities = list(map(int, agent_cap_entry.get().split(",")))
                 weight_range = tuple(map(int, weight_range_entry.get().split(",")))
-
-                env = Warehouse(
-                    shelf_columns=n_cols,
-                    shelf_rows=n_rows,
-                    column_height=col_height,
-                    n_agents=n_agents,
-                    msg_bits=0,
-                    sensor_range=1,
-                    request_queue_size=rq_size,
-                    agent_capacities=agent_capacities,
-                    shelf_weight_range=weight_range,
-                    max_inactivity_steps=None,
-                    max_steps=None,
-                    reward_type=RewardType.GLOBAL,
-                )
-
-                sim_process = Process(
-                    target=run_simulation, 
-                    args=(env, log_queue, render_var.get(), sleep_time_var.get(), max_deliveries)
-                )
-                sim_process.start()
-
             except ValueError as e:
                 log_queue.put(f"Invalid input: {e}")
                 return
 
+            env_spec = {
+                "kind": "custom",
+                "params": {
+                    "shelf_columns": n_cols,
+                    "shelf_rows": n_rows,
+                    "column_height": col_height,
+                    "n_agents": n_agents,
+                    "msg_bits": 0,
+                    "sensor_range": 1,
+                    "request_queue_size": rq_size,
+                    "agent_capacities": agent_capacities,
+                    "shelf_weight_range": weight_range,
+                    "max_inactivity_steps": None,
+                    "max_steps": None,
+                    "reward_type": RewardType.GLOBAL,
+                },
+            }
+
+        running_event.set()
+        cmd_queue.put({
+            "cmd": "start",
+            "spec": env_spec,
+            # Plain Python values, read from Tk once per run
+            "render": bool(render_var.get()),
+            "sleep_time": float(sleep_time_var.get()),
+            "max_deliveries": int(max_deliveries),
+        })
+
     def stop():
-        stop_event.set()
-        if sim_process and sim_process.is_alive():
-            sim_process.terminate()
+        nonlocal watchdog_id
+        stop_flag.value = 1
+        # One grace period per run: restart it rather than stacking another watchdog
+        cancel_watchdog()
+        watchdog_id = root.after(STOP_TIMEOUT_MS, stop_watchdog)
+
+    def stop_watchdog():
+        # Last resort: the worker did not finish its run after being asked to stop
+        nonlocal worker, watchdog_id
+        watchdog_id = None
+        if running_event.is_set() and stop_flag.value:
+            worker.terminate()
+            worker.join()
+            running_event.clear()
+            worker = spawn_worker()
 
     # Buttons
     btn_frame = ttk.Frame(control_frame)
@@ -285,24 +441,32 @@ def gui():
     # Initialize with the predefined environment visible
     toggle_inputs(env_type.get())
     # Output area
-    log_text = tk.Text(output_frame, wrap="word", height=20, state="disabled", bg="#f4f4f4", font=("Courier", 10))
+    log_text = tk.Text(output_frame, wrap="word", height=20, state="disabled", bg="#f4f4f4", font=("Courier", 10),
+                       undo=False, autoseparators=False, maxundo=0)
     log_text.pack(expand=True, fill="both")
     log_scroll = ttk.Scrollbar(output_frame, command=log_text.yview)
     log_scroll.pack(side="right", fill="y")
     log_text.config(yscrollcommand=log_scroll.set)
 
+    # Only the worker's output is redirected; the GUI process keeps its own stdout
     redirector = TextRedirector(log_text, log_queue)
-    sys.stdout = redirector
-    sys.stderr = redirector
 
     def poll_output():
-        redirector.update_widget()
-        root.after(100, poll_output)
+        if redirector.update_widget():
+            root.after_idle(poll_output)
+        else:
+            root.after(IDLE_POLL_MS, poll_output)
 
     poll_output()
 
+    # Lay out the finished widget tree in a single geometry pass
+    root.update_idletasks()
     root.mainloop()
 
+    stop_flag.value = 1
+    cmd_queue.put({"cmd": "quit"})
+    worker.join(timeout=STOP_TIMEOUT_MS / 1000)
+
 
 if __name__ == "__main__":
     gui()
\ No newline at end of file
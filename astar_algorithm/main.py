@@ -3,56 +3,82 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 
+from argparse import ArgumentParser
+from collections import deque
 import time
+import numpy as np
 import gymnasium as gym
 import rware
 from rware.warehouse import RewardType, Warehouse
 from shelf_movement import ShelfCarryingMovement
 from shared_functions.warehouse_initializer import WarehouseInitializer
 from shared_functions.metrics_tracker import MetricsTracker
-from shared_functions.enums import Action
+from shared_functions.enums import Action, AgentState
+
+# Action codes resolved once at import; get_actions emits them for every agent every step
+NOOP = Action.NOOP.value
+FORWARD = Action.FORWARD.value
+LEFT = Action.LEFT.value
+RIGHT = Action.RIGHT.value
+TOGGLE_LOAD = Action.TOGGLE_LOAD.value
 
 class WarehouseController:
-    def __init__(self, env):
+    def __init__(self, env, verbose=False):
         self.env = env.unwrapped
-        self.metrics = MetricsTracker() 
+        self.verbose = verbose  # Per-agent stuck/recovery/critical-battery messages
+        self.metrics = MetricsTracker(self.env.n_agents, verbose=verbose)
         
         # Initialize agent states
-        self.agent_states = {}  # "seek_shelf", "deliver", "return_shelf"
+        self.agent_states = {}  # AgentState per agent
         self.agent_targets = {}  # Current target for each agent
-        self.last_positions = {}
-        self.stuck_count = {}
         self.last_actions = {}
         self.agent_capacities = {}  # Track agent capacities
         self.shelf_weights = {}  # Track shelf weights
-        self.reserved_shelves = {}  # Track which shelves are reserved by which agents
-        self.shelf_reservation_time = {}  # Track how long a shelf has been reserved
+        # Shelf reservations, allocated once the shelves exist (see _init_reservations)
+        self.reservation_agent = None
+        self.reservation_time = None
         self.current_step = 0  
         self.low_battery_threshold = 20  # Percentage at which agent seeks charging
         self.critical_battery_threshold = 10  # Percentage where charging is mandatory
+        self.battery_pct_scale = 100.0 / self.env.battery_capacity  # battery level -> percentage
         self.charging_stations = self._identify_charging_stations()
+        self.station_set = frozenset(self.charging_stations)
         self.pre_charging_states = {}  # To remember what agents were doing before charging
         self.pre_charging_targets = {}  # To remember targets before charging
         self.pre_charging_shelf = {}    # To remember which shelf was being carried before charging
         self.pre_charging_data = {} # Stores dict of {state, targets, shelf_info}
         
         self.assigned_waiting_areas = {}  # New: track assigned waiting area
-        self.in_recovery = {} 
+        self.agents_by_position = {}  # (x, y) -> agents there, rebuilt every step
 
         # Initialize agent-specific data
         for agent in self.env.agents:
-            self.agent_states[agent.id] = "seek_shelf"
+            self.agent_states[agent.id] = AgentState.SEEK_SHELF
             self.agent_targets[agent.id] = None
-            self.last_positions[agent.id] = (agent.x, agent.y)
-            self.stuck_count[agent.id] = 0
-            self.last_actions[agent.id] = []
+            self.last_actions[agent.id] = deque()
             self.agent_capacities[agent.id] = agent.max_carry_weight  # Store capacity
+        self._init_stuck_tracking()
 
         # Initialize shelf weights
         for shelf in self.env.request_queue:
             self.shelf_weights[shelf.id] = shelf.weight
 
 
+    def _init_stuck_tracking(self):
+        """Per-agent stuck bookkeeping as arrays indexed by ``agent.id - 1``"""
+        n_agents = len(self.env.agents)
+        self.last_positions = np.array(
+            [(int(agent.x), int(agent.y)) for agent in self.env.agents], dtype=np.int32
+        ).reshape(n_agents, 2)
+        self.stuck_count = np.zeros(n_agents, dtype=np.int32)
+        self.in_recovery = np.zeros(n_agents, dtype=bool)
+
+    def _init_reservations(self):
+        """Reservations indexed by shelf id: reserving agent id and step reserved (-1 = free)"""
+        n_shelf_ids = max((shelf.id for shelf in self.env.shelfs), default=0) + 1
+        self.reservation_agent = np.full(n_shelf_ids, -1, dtype=np.int16)
+        self.reservation_time = np.full(n_shelf_ids, -1, dtype=np.int32)
+
     def _identify_charging_stations(self):
         """Identify charging station locations (assuming they're in the corners)"""
         grid_size = self.env.grid_size
@@ -65,7 +91,7 @@ class WarehouseController:
 
     def _needs_charging(self, agent):
         """Check if agent needs to charge based on battery level"""
-        battery_pct = (agent.battery_level / self.env.battery_capacity) * 100
+        battery_pct = agent.battery_level * self.battery_pct_scale
         return battery_pct < self.low_battery_threshold
 
 
@@ -74,50 +100,37 @@ class WarehouseController:
         current_pos = (int(agent.x), int(agent.y))
         
         # Check if agent is already at a charging station
-        if current_pos in self.charging_stations:
+        if current_pos in self.station_set:
             # print(f"Agent {agent.id} is already at charging station {current_pos}")
             return None  # Already at charging station
         
-        # Get all stations sorted by distance (closest first)
-        stations_sorted = sorted(
-            self.charging_stations,
-            key=lambda station: abs(station[0] - agent.x) + abs(station[1] - agent.y)
-        )
-        
-        # Check each station in order of distance
-        for station in stations_sorted:
-            # Skip if this is the agent's current position
-            if (int(agent.x), int(agent.y)) == station:
-                continue
-                
+        # One pass: the closest station that is free or about to free up,
+        # falling back to the closest station overall to wait in queue
+        closest_station = None
+        closest_dist = None
+        available_station = None
+        available_dist = None
+        for station in self.charging_stations:
             dist = abs(station[0] - agent.x) + abs(station[1] - agent.y)
-            charging_agents = []
+            if closest_dist is None or dist < closest_dist:
+                closest_station, closest_dist = station, dist
+            if available_dist is not None and dist >= available_dist:
+                continue
             
             # Check which agents are at this station
-            for other_agent in self.env.agents:
-                if (int(other_agent.x), int(other_agent.y)) == station:
-                    charging_agents.append(other_agent)
-            
-            # If station is empty, it's available
-            if not charging_agents:
-                # print(f"Agent {agent.id} found available charging station: {station} (Distance: {dist})")
-                return station
+            charging_agents = self.agents_by_position.get(station, [])
             
-            # If station has charging agents, check if any are nearly full
-            for charging_agent in charging_agents:
-                battery_pct = (charging_agent.battery_level / self.env.battery_capacity) * 100
-                if battery_pct > 90:  # Agent is nearly full, will vacate soon
-                    # print(f"Agent {agent.id} queuing at station {station} (Agent {charging_agent.id} is at {battery_pct:.1f}%)")
-                    return station
-        
+            # Available if empty, or if an agent there is nearly full and will vacate soon
+            if not charging_agents or any(
+                charging_agent.battery_level * self.battery_pct_scale > 90
+                for charging_agent in charging_agents
+            ):
+                available_station, available_dist = station, dist
+        
+        if available_station is not None:
+            return available_station
         # If all stations are occupied, go to the closest one and wait in queue
-        if stations_sorted:
-            closest_station = stations_sorted[0]
-            # print(f"Agent {agent.id} all stations occupied - going to closest ({closest_station}) to queue")
-            return closest_station
-        
-        # print(f"Agent {agent.id} - No charging stations found!")
-        return None
+        return closest_station
 
     def initialize_and_verify(self, env):
         """Initialize and verify all environment components"""
@@ -127,19 +140,31 @@ class WarehouseController:
         self.rows = initialization_data.rows
         self.cols = initialization_data.cols
         self.goal_locations = initialization_data.goal_locations
+        # Same iteration order as the set, so argmin ties match min() over it
+        self.goal_array = np.array(list(self.goal_locations), dtype=int).reshape(-1, 2)
         self.shelf_locations = initialization_data.shelf_locations
         self.agent_locations = initialization_data.agent_locations
         self.shelf_memory = initialization_data.shelf_memory
         self.agent_states = initialization_data.agent_states
         self.shelf_memory = initialization_data.shelf_memory
         self.agent_targets = initialization_data.agent_targets
-        self.last_positions = initialization_data.last_positions
-        self.stuck_count = initialization_data.stuck_count
         self.last_actions = initialization_data.last_actions
+        self._init_stuck_tracking()
+        self._init_reservations()
 
         self.shelf_mover = ShelfCarryingMovement(env, self.agent_states)
         # self.movement_controller = MovementController(self)
         self.waiting_areas = self._identify_waiting_areas()  # New: identify waiting areas
+        # Fixed for the episode: coordinates and list index of each waiting area
+        self.waiting_area_array = np.array(self.waiting_areas, dtype=int).reshape(-1, 2)
+        self.waiting_area_index = {area: i for i, area in enumerate(self.waiting_areas)}
+
+    def _closest_goal(self, agent):
+        """Goal location nearest to the agent by Manhattan distance"""
+        dists = (np.abs(self.goal_array[:, 0] - agent.x) +
+                 np.abs(self.goal_array[:, 1] - agent.y))
+        x, y = self.goal_array[int(np.argmin(dists))]
+        return (int(x), int(y))
 
     def _get_aligned_position(self, pos):
         """Ensure position is within grid bounds"""
@@ -147,6 +172,13 @@ class WarehouseController:
         y = max(0, min(int(pos[1]), self.rows-1))
         return (x, y)
     
+    def _queue_plan(self, agent, movement_sequence):
+        """Queue a fresh plan in the agent's action deque and return its first action"""
+        queued = self.last_actions[agent.id]
+        queued.clear()
+        queued.extend(movement_sequence)
+        return queued.popleft()
+
     def _get_recovery_actions(self, agent):
         """More intelligent recovery considering carrying state"""
         recovery = []
@@ -157,50 +189,51 @@ class WarehouseController:
         if is_carrying:
             # When carrying, prioritize backing up and turning
             recovery = [
-                Action.LEFT.value,
-                Action.LEFT.value,  # Turn 180
-                Action.FORWARD.value,  # Back up
-                Action.RIGHT.value,  # Turn right
-                Action.FORWARD.value  # Move forward
+                LEFT,
+                LEFT,  # Turn 180
+                FORWARD,  # Back up
+                RIGHT,  # Turn right
+                FORWARD  # Move forward
             ]
         else:
             # When not carrying, can be more flexible
             pattern = (self.env.current_step + agent_id) % 3
             if pattern == 0:
-                recovery = [Action.LEFT.value, Action.FORWARD.value]
+                recovery = [LEFT, FORWARD]
             elif pattern == 1:
-                recovery = [Action.RIGHT.value, Action.FORWARD.value]
+                recovery = [RIGHT, FORWARD]
             else:
                 recovery = [
-                    Action.LEFT.value, 
-                    Action.LEFT.value,
-                    Action.FORWARD.value
+                    LEFT, 
+                    LEFT,
+                    FORWARD
                 ]
         
         # Mark current position as temporarily blocked
         self.shelf_helper.add_temporary_block((int(agent.x), int(agent.y)))
         
-        return recovery
+        return deque(recovery)
     
     def _can_carry_any_shelf(self, agent):
         """Check if there are any shelves in request queue that agent can carry"""
-        for shelf in self.env.request_queue:
-            # Skip if shelf is already being carried
-            if any(a.carrying_shelf == shelf for a in self.env.agents):
-                continue
-                
-            # Skip if shelf is reserved by another agent (unless reservation expired)
-            if shelf.id in self.reserved_shelves:
-                reserving_agent = self.reserved_shelves[shelf.id]
-                reservation_time = self.shelf_reservation_time.get(shelf.id, 0)
-                if reserving_agent != agent.id and (self.current_step - reservation_time) < 20:
-                    continue
-            
-            # If we find at least one shelf the agent can carry, return True
-            if shelf.weight <= agent.max_carry_weight:
-                return True
-        return False
+        return bool(self._available_shelf_mask(agent).any())
     
+    def _available_shelf_mask(self, agent):
+        """Boolean mask over the request queue of shelves this agent may target now"""
+        mask = ~self.queue_carried & (self.queue_weights <= agent.max_carry_weight)
+        # Reservations change during the pass, so they are applied per agent
+        reserving_agent = self.reservation_agent[self.queue_ids]
+        reserved_by_other = (
+            (reserving_agent >= 0) & (reserving_agent != agent.id) &
+            (self.current_step - self.reservation_time[self.queue_ids] < 20)  # 20 step timeout
+        )
+        return mask & ~reserved_by_other
+
+    def _release_reservation(self, shelf_id):
+        """Drop any reservation held on the shelf"""
+        self.reservation_agent[shelf_id] = -1
+        self.reservation_time[shelf_id] = -1
+
     def _identify_waiting_areas(self):
         """Identify suitable waiting areas for idle agents.
         These are spaces that aren't shelf locations, goal locations, charging stations,
@@ -209,47 +242,28 @@ class WarehouseController:
         grid_size = self.env.grid_size
         rows, cols = grid_size
         
-        # Start with all possible positions
-        all_positions = [(x, y) for x in range(cols) for y in range(rows)]
-        
-        # Get all shelf positions
-        shelf_positions = set((int(shelf.x), int(shelf.y)) for shelf in self.env.shelfs)
-        
-        # Remove occupied locations
-        occupied = set()
-        
-        # Remove shelf locations
-        occupied.update(shelf_positions)
-        
-        # Remove goal locations
-        for goal in self.goal_locations:
-            occupied.add(goal)
-        
-        # Remove charging stations
-        for station in self.charging_stations:
-            occupied.add(station)
-        
-        # Function to check if a position is adjacent to any shelf in 8 directions
-        def is_adjacent_to_shelf(pos):
-            x, y = pos
-            # All 8 possible adjacent positions
-            adjacent_positions = [
-                (x-1, y),    # left
-                (x+1, y),    # right
-                (x, y-1),    # up
-                (x, y+1),    # down
-                (x-1, y-1),  # left-up
-                (x+1, y-1),  # right-up
-                (x-1, y+1),  # left-down
-                (x+1, y+1)   # right-down
-            ]
-            return any(adj_pos in shelf_positions for adj_pos in adjacent_positions)
+        # Masks are indexed [x, y] so np.argwhere yields positions in (x, y) order
+        shelf_mask = np.zeros((cols, rows), dtype=bool)
+        for shelf in self.env.shelfs:
+            shelf_mask[int(shelf.x), int(shelf.y)] = True
+        
+        # Occupied: shelf locations, goal locations and charging stations
+        occupied = shelf_mask.copy()
+        for x, y in self.goal_locations:
+            occupied[x, y] = True
+        for x, y in self.charging_stations:
+            occupied[x, y] = True
+        
+        # A cell is adjacent to a shelf if any of its 8 neighbours holds one
+        padded = np.pad(shelf_mask, 1)
+        adjacent = np.zeros_like(shelf_mask)
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                if dx or dy:
+                    adjacent |= padded[1 + dx:1 + dx + cols, 1 + dy:1 + dy + rows]
         
         # Available positions are those not occupied and not adjacent to shelves
-        available = [
-            pos for pos in all_positions 
-            if pos not in occupied and not is_adjacent_to_shelf(pos)
-        ]
+        available = [(int(x), int(y)) for x, y in np.argwhere(~(occupied | adjacent))]
         
         # If no positions are available, use corners as a fallback
         if not available:
@@ -260,7 +274,7 @@ class WarehouseController:
                 (cols-1, rows-1)   # Bottom-right
             ]
             # Filter out corners that are adjacent to shelves
-            available = [pos for pos in corners if not is_adjacent_to_shelf(pos)]
+            available = [pos for pos in corners if not adjacent[pos]]
             
             # If still no positions available, just return all corners
             if not available:
@@ -271,27 +285,21 @@ class WarehouseController:
     # Add this method to assign a waiting area to an idle agent:
     def _get_waiting_area(self, agent):
         """Get suitable waiting area for an idle agent"""
-        if not hasattr(self, 'waiting_areas'):
-            self.waiting_areas = self._identify_waiting_areas()
-        
-        if not hasattr(self, 'assigned_waiting_areas'):
-            self.assigned_waiting_areas = {}
-        
         # If agent already has an assigned area, keep using it
         if agent.id in self.assigned_waiting_areas:
             return self.assigned_waiting_areas[agent.id]
         
-        # Find which waiting areas are already assigned
-        occupied_areas = set(self.assigned_waiting_areas.values())
+        # Mask out waiting areas that are already assigned
+        available = np.ones(len(self.waiting_areas), dtype=bool)
+        for area in self.assigned_waiting_areas.values():
+            available[self.waiting_area_index[area]] = False
         
-        # Find an unoccupied waiting area
-        available_areas = [area for area in self.waiting_areas if area not in occupied_areas]
-        
-        if available_areas:
+        if available.any():
             # Assign the closest available area
-            current_pos = (int(agent.x), int(agent.y))
-            closest_area = min(available_areas, 
-                            key=lambda pos: abs(pos[0] - current_pos[0]) + abs(pos[1] - current_pos[1]))
+            dists = (np.abs(self.waiting_area_array[:, 0] - int(agent.x)) +
+                     np.abs(self.waiting_area_array[:, 1] - int(agent.y)))
+            dists = np.where(available, dists, np.inf)
+            closest_area = self.waiting_areas[int(np.argmin(dists))]
             self.assigned_waiting_areas[agent.id] = closest_area
             return closest_area
         else:
@@ -301,42 +309,66 @@ class WarehouseController:
             self.assigned_waiting_areas[agent.id] = area
             return area
         
-    def get_actions(self):
+    def get_actions(self, out=None):
+        """Return one action per agent; written into ``out`` when a buffer is given"""
         
 
         current_step = self.current_step  # Use our controller's step counter
-        expired = [shelf_id for shelf_id, step in self.shelf_reservation_time.items() 
-                if (current_step - step) >= 20]  # 20 step timeout
-        for shelf_id in expired:
-            del self.reserved_shelves[shelf_id]
-            del self.shelf_reservation_time[shelf_id]
+        expired = (self.reservation_time >= 0) & (current_step - self.reservation_time >= 20)  # 20 step timeout
+        self.reservation_agent[expired] = -1
+        self.reservation_time[expired] = -1
         actions = []
 
         self.metrics.record_total_steps()
+        agents = self.env.agents
+        queue = self.env.request_queue
+
+        # Agents do not move until env.step(), so one position index serves the whole pass
+        self.agents_by_position = {}
+        for agent in agents:
+            self.agents_by_position.setdefault((int(agent.x), int(agent.y)), []).append(agent)
+
+        # Request-queue and carried-shelf snapshot for shelf searches (also fixed until env.step())
+        self.request_by_id = {shelf.id: shelf for shelf in queue}
+        self.carrier_by_shelf_id = {
+            a.carrying_shelf.id: a for a in agents if a.carrying_shelf
+        }
+        self.queue_ids = np.array([shelf.id for shelf in queue], dtype=np.intp)
+        self.queue_positions = np.array(
+            [(shelf.x, shelf.y) for shelf in queue], dtype=int
+        ).reshape(-1, 2)
+        # _get_aligned_position for the whole queue at once
+        np.clip(self.queue_positions, 0, (self.cols - 1, self.rows - 1), out=self.queue_positions)
+        self.queue_weights = np.array([shelf.weight for shelf in queue])
+        self.queue_carried = np.array(
+            [shelf.id in self.carrier_by_shelf_id for shelf in queue], dtype=bool
+        )
 
-        for agent in self.env.agents:
-            self.metrics.record_movement(agent.id)
+        # Per-agent counters only touch each agent's own slot, so they can be bumped up front
+        self.metrics.record_all_movements()
+        for agent in agents:
+            # Positions only change in env.step(), so one cast serves every branch below
+            current_pos = (int(agent.x), int(agent.y))
             # Check if agent has no shelf to carry (only if not already in another state)
-            if (self.agent_states[agent.id] not in ["deliver", "return_shelf", "charging"] and 
+            if (self.agent_states[agent.id] not in [AgentState.DELIVER, AgentState.RETURN_SHELF, AgentState.CHARGING] and 
                 not self._can_carry_any_shelf(agent)):
-                self.agent_states[agent.id] = "no_shelf_to_carry"
+                self.agent_states[agent.id] = AgentState.NO_SHELF_TO_CARRY
                 self.agent_targets[agent.id] = None
-                self.last_actions[agent.id] = []
+                self.last_actions[agent.id] = deque()
                 # print(f"Agent {agent.id} has no shelf it can carry (max capacity: {agent.max_carry_weight})")
             
             # Replace it with:
-            if self.agent_states[agent.id] == "no_shelf_to_carry":
+            if self.agent_states[agent.id] == AgentState.NO_SHELF_TO_CARRY:
                 if self._can_carry_any_shelf(agent):
                     # Found a shelf we can carry - switch back to seek_shelf
-                    self.agent_states[agent.id] = "seek_shelf"
+                    self.agent_states[agent.id] = AgentState.SEEK_SHELF
                 else:
                     # Move to waiting area instead of just stopping
                     waiting_area = self._get_waiting_area(agent)
-                    current_pos = (int(agent.x), int(agent.y))
                     
                     # If already at waiting area, stay there
                     if current_pos == waiting_area:
-                        actions.append(Action.NOOP.value)
+                        actions.append(NOOP)
                     else:
                         # Move toward waiting area
                         if not self.agent_targets.get(agent.id):
@@ -344,186 +376,163 @@ class WarehouseController:
                         
                         movement_sequence = self.shelf_mover.calculate_movement(agent, waiting_area)
                         if movement_sequence:
-                            self.last_actions[agent.id] = movement_sequence[1:]
-                            actions.append(movement_sequence[0])
+                            actions.append(self._queue_plan(agent, movement_sequence))
                         else:
-                            actions.append(Action.NOOP.value)
+                            actions.append(NOOP)
                     continue
-            battery_pct = (agent.battery_level / self.env.battery_capacity) * 100
+            battery_pct = agent.battery_level * self.battery_pct_scale
 
             # Add this check for battery failure at the beginning of your per-agent loop in get_actions()
             if agent.battery_level <= 0:  # Battery completely depleted
                 self.metrics.record_battery_failure(agent.id)
-                actions.append(Action.NOOP.value)  # Agent can't do anything when battery is dead
+                actions.append(NOOP)  # Agent can't do anything when battery is dead
                 continue
 
             # --- Battery Check Logic ---
             # Emergency charging if critical
             if battery_pct < self.critical_battery_threshold and not agent.is_charging:
                 self.metrics.record_critical_battery(agent.id, battery_pct)  # Add this line
-                if self.agent_states[agent.id] != "charging":  # Only store state if we're not already charging
+                if self.agent_states[agent.id] != AgentState.CHARGING:  # Only store state if we're not already charging
                     if (agent.id in self.agent_targets and 
                         self.agent_targets[agent.id] is not None):
                         self._store_pre_charging_state(agent)
                 closest_station = self._get_closest_charging_station(agent)
                 if closest_station:
-                    print(f"Agent {agent.id} in CRITICAL battery ({battery_pct:.1f}%) - going to charge")
+                    if self.verbose:
+                        print(f"Agent {agent.id} in CRITICAL battery ({battery_pct:.1f}%) - going to charge")
                     self.metrics.record_charging_start(agent.id)
-                    self.agent_states[agent.id] = "charging"
+                    self.agent_states[agent.id] = AgentState.CHARGING
                     self.agent_targets[agent.id] = {'position': closest_station}
-                    self.last_actions[agent.id] = []
+                    self.last_actions[agent.id] = deque()
             
             # Normal charging when low
-            if (self._needs_charging(agent) and not agent.is_charging and self.agent_states[agent.id] != "charging"):
+            if (self._needs_charging(agent) and not agent.is_charging and self.agent_states[agent.id] != AgentState.CHARGING):
                 self.metrics.record_low_battery(agent.id, battery_pct)  # Add this line
-                if self.agent_states[agent.id] != "charging":  # Only store state if we're not already charging
+                if self.agent_states[agent.id] != AgentState.CHARGING:  # Only store state if we're not already charging
                     self._store_pre_charging_state(agent)
                 closest_station = self._get_closest_charging_station(agent)
                 if closest_station:
                     # print(f"Agent {agent.id} low battery ({battery_pct:.1f}%) - going to charge")
                     self.metrics.record_charging_start(agent.id)
-                    self.agent_states[agent.id] = "charging"
+                    self.agent_states[agent.id] = AgentState.CHARGING
                     self.agent_targets[agent.id] = {'position': closest_station}
-                    self.last_actions[agent.id] = []
+                    self.last_actions[agent.id] = deque()
             
-            current_pos = (int(agent.x), int(agent.y))
+            idx = agent.id - 1
+            last_x, last_y = self.last_positions[idx]
+            stayed = current_pos == (last_x, last_y)
 
             # Check if agent is stuck (same position for multiple steps)
-            if self.last_actions.get(agent.id) and current_pos == self.last_positions.get(agent.id) and self.last_actions[agent.id][0] == Action.FORWARD.value:
-                self.stuck_count[agent.id] += 1
+            if self.last_actions.get(agent.id) and stayed and self.last_actions[agent.id][0] == FORWARD:
+                self.stuck_count[idx] += 1
                 
             else:
-                self.stuck_count[agent.id] = 0
+                self.stuck_count[idx] = 0
                 # self.last_positions[agent.id] = current_pos
 
-            if (self.stuck_count.get(agent.id, 0) > 1 and 
+            if (self.stuck_count[idx] > 1 and 
                 not agent.is_charging and 
-                not self.agent_states[agent.id] == "no_shelf_to_carry") and not self.in_recovery.get(agent.id, False):
-                print(f"Agent {agent.id} stuck at {current_pos}, initiating recovery...")
+                not self.agent_states[agent.id] == AgentState.NO_SHELF_TO_CARRY) and not self.in_recovery[idx]:
+                if self.verbose:
+                    print(f"Agent {agent.id} stuck at {current_pos}, initiating recovery...")
                 # self.stuck_count[agent.id] = 0
                 # Clear current action queue
-                self.last_actions[agent.id] = []
+                self.last_actions[agent.id] = deque()
                 self.metrics.record_collision(agent.id)  # Record collision
                 
-                self.in_recovery[agent.id] = True
+                self.in_recovery[idx] = True
             
-            if self.in_recovery.get(agent.id) is True:
+            if self.in_recovery[idx]:
                 self.metrics.record_recovery_step(agent.id)
                 # self.last_positions[agent.id] = current_pos
             
-            if current_pos != self.last_positions.get(agent.id) and self.last_actions.get(agent.id) and self.last_actions[agent.id][0] == Action.FORWARD.value and self.in_recovery.get(agent.id) is True:
+            if not stayed and self.last_actions.get(agent.id) and self.last_actions[agent.id][0] == FORWARD and self.in_recovery[idx]:
                 # self.last_positions[agent.id] = current_pos
-                print(f"Agent {agent.id} recovered from stuck state at {current_pos}")
-                self.stuck_count[agent.id] = 0
-                self.in_recovery[agent.id] = False
+                if self.verbose:
+                    print(f"Agent {agent.id} recovered from stuck state at {current_pos}")
+                self.stuck_count[idx] = 0
+                self.in_recovery[idx] = False
                 self.metrics.record_recovery_complete(agent.id)
                 
-            self.last_positions[agent.id] = current_pos    
+            self.last_positions[idx] = current_pos    
             # Rest of your existing action selection logic...
             queued_actions = self.last_actions.get(agent.id, [])
             
             if queued_actions:
-                action = queued_actions.pop(0)
+                action = queued_actions.popleft()
                 actions.append(action)
                 continue
             
             # Default to NOOP if no other action is determined
-            action = Action.NOOP.value
+            action = NOOP
             
-            if self.agent_states[agent.id] == "charging":
+            if self.agent_states[agent.id] == AgentState.CHARGING:
                 if agent.is_charging:
                     # Already charging
                     if agent.battery_level >= self.env.battery_capacity:  
                         self._restore_pre_charging_state(agent)
                         self.metrics.record_charging_end(agent.id)
                     else:
-                        actions.append(Action.NOOP.value)
+                        actions.append(NOOP)
                         continue
                 else:
                     # Moving to charging station
                     station_pos = self.agent_targets[agent.id]['position']
-                    current_pos = (int(agent.x), int(agent.y))
                     
                     # If reached station, start charging if available
                     if current_pos == station_pos:
                         # Check if station is available (no one charging or someone nearly full)
                         station_available = True
-                        for other_agent in self.env.agents:
-                            if (other_agent != agent and 
-                                (int(other_agent.x), int(other_agent.y)) == station_pos and
-                                other_agent.is_charging):
-                                battery_pct = (other_agent.battery_level / self.env.battery_capacity) * 100
+                        for other_agent in self.agents_by_position.get(station_pos, []):
+                            if other_agent != agent and other_agent.is_charging:
+                                battery_pct = other_agent.battery_level * self.battery_pct_scale
                                 if battery_pct < 90:  # Other agent still needs significant charging
                                     station_available = False
                                     break
                         
                         if station_available:
-                            actions.append(Action.NOOP.value)  # Will start charging
+                            actions.append(NOOP)  # Will start charging
                         else:
                             # Wait in queue (small movements to avoid blocking)
                             if len(self.last_actions.get(agent.id, [])) < 2:
                                 # Create small back-and-forth pattern
-                                self.last_actions[agent.id] = [
-                                    Action.LEFT.value,
-                                    Action.RIGHT.value
-                                ]
-                            action = self.last_actions[agent.id].pop(0)
+                                self.last_actions[agent.id] = deque([
+                                    LEFT,
+                                    RIGHT
+                                ])
+                            action = self.last_actions[agent.id].popleft()
                             actions.append(action)
                     else:
                         # Continue moving to station
                         movement_sequence = self.shelf_mover.calculate_movement(agent, station_pos)
                         if movement_sequence:
-                            self.last_actions[agent.id] = movement_sequence[1:]
-                            actions.append(movement_sequence[0])
+                            actions.append(self._queue_plan(agent, movement_sequence))
                         else:
-                            actions.append(Action.NOOP.value)
+                            actions.append(NOOP)
                     continue
             
             # State: Seeking a shelf to pick up
-            if self.agent_states[agent.id] == "seek_shelf":
+            if self.agent_states[agent.id] == AgentState.SEEK_SHELF:
                 if agent.id in self.assigned_waiting_areas:
                     del self.assigned_waiting_areas[agent.id]
                 # Replan if no current path or target not reached
                 if not self.last_actions.get(agent.id) or \
-                (int(agent.x), int(agent.y)) != (int(self.agent_targets[agent.id]['position'][0]), 
+                current_pos != (int(self.agent_targets[agent.id]['position'][0]), 
                                                 int(self.agent_targets[agent.id]['position'][1])):
                     
                     # Find closest available shelf
                     closest_shelf = None
-                    min_dist = float('inf')
-                    
-                    for shelf in self.env.request_queue:
-                        # Skip if shelf is already being carried
-                        if any(a.carrying_shelf == shelf for a in self.env.agents):
-                            carrying_agent = next(a for a in self.env.agents if a.carrying_shelf == shelf)
-                            continue
-                        
-                        # Skip if shelf is reserved by another agent (unless reservation expired)
-                        if shelf.id in self.reserved_shelves:
-                            reserving_agent = self.reserved_shelves[shelf.id]
-                            reservation_time = self.shelf_reservation_time.get(shelf.id, 0)
-                            
-                            # If reserved by another agent and not expired, skip
-                            if reserving_agent != agent.id and (self.current_step - reservation_time) < 20:  # 20 step timeout
-                                # print(f"  Shelf {shelf.id} reserved by agent {reserving_agent}")
-                                continue
-                        
-
-                        # Check if agent can carry this shelf
-                        if shelf.weight > agent.max_carry_weight:
-                            # print(f"  Agent {agent.id} cannot carry shelf {shelf.id} (weight {shelf.weight} > capacity {agent.max_carry_weight})")
-                            continue
-                        
-                        shelf_pos = self._get_aligned_position((shelf.x, shelf.y))
-                        dist = abs(shelf_pos[0]-agent.x) + abs(shelf_pos[1]-agent.y)
-                        if dist < min_dist:
-                            min_dist = dist
-                            closest_shelf = shelf
+                    candidates = self._available_shelf_mask(agent)
+                    if candidates.any():
+                        dists = (np.abs(self.queue_positions[:, 0] - agent.x) +
+                                 np.abs(self.queue_positions[:, 1] - agent.y))
+                        dists = np.where(candidates, dists, np.inf)
+                        closest_shelf = queue[int(np.argmin(dists))]
                     
                     if closest_shelf:
                         # Reserve this shelf for current agent
-                        self.reserved_shelves[closest_shelf.id] = agent.id
-                        self.shelf_reservation_time[closest_shelf.id] = self.current_step
+                        self.reservation_agent[closest_shelf.id] = agent.id
+                        self.reservation_time[closest_shelf.id] = self.current_step
                         
                         target_pos = self._get_aligned_position((closest_shelf.x, closest_shelf.y))
                         self.agent_targets[agent.id] = {
@@ -532,7 +541,7 @@ class WarehouseController:
                         }
                         
 
-                        if closest_shelf and not (int(agent.x), int(agent.y)) == (int(closest_shelf.x), int(closest_shelf.y)):
+                        if closest_shelf and not current_pos == (int(closest_shelf.x), int(closest_shelf.y)):
                             self.metrics.record_task_start(agent.id, closest_shelf.id)
                         
                         
@@ -540,37 +549,31 @@ class WarehouseController:
                         movement_sequence = self.shelf_mover.calculate_movement(agent, target_pos)
                         
                         if movement_sequence:
-                            self.last_actions[agent.id] = movement_sequence[1:]
-                            action = movement_sequence[0]
+                            action = self._queue_plan(agent, movement_sequence)
 
                     
                 
                 # Check if reached shelf position
-                if closest_shelf and (int(agent.x), int(agent.y)) == (int(closest_shelf.x), int(closest_shelf.y)):
+                if closest_shelf and current_pos == (int(closest_shelf.x), int(closest_shelf.y)):
                     # Verify weight constraint again before picking up
                     if closest_shelf.weight <= agent.max_carry_weight:
-                        action = Action.TOGGLE_LOAD.value
-                        self.agent_states[agent.id] = "deliver"
-                        self.last_actions[agent.id] = []
+                        action = TOGGLE_LOAD
+                        self.agent_states[agent.id] = AgentState.DELIVER
+                        self.last_actions[agent.id] = deque()
                         
                         # Clear the reservation since we're now carrying the shelf
-                        if closest_shelf.id in self.reserved_shelves:
-                            del self.reserved_shelves[closest_shelf.id]
-                            del self.shelf_reservation_time[closest_shelf.id]
+                        self._release_reservation(closest_shelf.id)
                         
                         # print(f"Agent {agent.id} picked up shelf {closest_shelf.id} (weight: {closest_shelf.weight})")
                     else:
                         # print(f"ERROR: Agent {agent.id} tried to pick up shelf {closest_shelf.id} that's too heavy!")
                         # Release reservation if can't pick up
                         self.metrics.record_overcapacity_attempt(agent.id, closest_shelf.id, closest_shelf.weight, agent.max_carry_weight)
-                        if closest_shelf.id in self.reserved_shelves:
-                            del self.reserved_shelves[closest_shelf.id]
-                            del self.shelf_reservation_time[closest_shelf.id]
+                        self._release_reservation(closest_shelf.id)
             
             # State: Delivering shelf to goal location
-            elif self.agent_states[agent.id] == "deliver" and agent.carrying_shelf:
-                closest_goal = min(self.goal_locations, 
-                                key=lambda g: abs(g[0]-agent.x) + abs(g[1]-agent.y))
+            elif self.agent_states[agent.id] == AgentState.DELIVER and agent.carrying_shelf:
+                closest_goal = self._closest_goal(agent)
                 
                 if agent.id in self.agent_targets:
                     self.agent_targets[agent.id]['position'] = closest_goal
@@ -578,19 +581,18 @@ class WarehouseController:
                 movement_sequence = self.shelf_mover.calculate_movement(agent, closest_goal)
                 
                 if movement_sequence:
-                    self.last_actions[agent.id] = movement_sequence[1:]
-                    action = movement_sequence[0]
+                    action = self._queue_plan(agent, movement_sequence)
                 
                 # Check if reached goal position
-                if (int(agent.x), int(agent.y)) == closest_goal:
-                    action = Action.TOGGLE_LOAD.value
-                    self.agent_states[agent.id] = "return_shelf"
-                    self.last_actions[agent.id] = []
+                if current_pos == closest_goal:
+                    action = TOGGLE_LOAD
+                    self.agent_states[agent.id] = AgentState.RETURN_SHELF
+                    self.last_actions[agent.id] = deque()
                     # print(f"Agent {agent.id} delivered shelf {agent.carrying_shelf.id}")
                     
             
             # State: Returning shelf to original position
-            elif self.agent_states[agent.id] == "return_shelf":
+            elif self.agent_states[agent.id] == AgentState.RETURN_SHELF:
                 if agent.carrying_shelf and agent.carrying_shelf.id in self.shelf_memory:
                     original_pos = self.shelf_memory[agent.carrying_shelf.id]
                     
@@ -600,21 +602,20 @@ class WarehouseController:
                     movement_sequence = self.shelf_mover.calculate_movement(agent, original_pos)
                     
                     if movement_sequence:
-                        self.last_actions[agent.id] = movement_sequence[1:]
-                        action = movement_sequence[0]
+                        action = self._queue_plan(agent, movement_sequence)
                     
                     # Check if reached original position
-                    if (int(agent.x), int(agent.y)) == original_pos:
-                        action = Action.TOGGLE_LOAD.value
-                        self.agent_states[agent.id] = "seek_shelf"
+                    if current_pos == original_pos:
+                        action = TOGGLE_LOAD
+                        self.agent_states[agent.id] = AgentState.SEEK_SHELF
                         self.agent_targets[agent.id] = None
-                        self.last_actions[agent.id] = []
+                        self.last_actions[agent.id] = deque()
                         # print(f"Agent {agent.id} returned shelf {agent.carrying_shelf.id}")
                         self.metrics.record_task_completion(agent.id, agent.carrying_shelf.id)
                 else:
-                    self.agent_states[agent.id] = "seek_shelf"
+                    self.agent_states[agent.id] = AgentState.SEEK_SHELF
                     self.agent_targets[agent.id] = None
-                    self.last_actions[agent.id] = []
+                    self.last_actions[agent.id] = deque()
             
 
             
@@ -622,9 +623,13 @@ class WarehouseController:
         
             
             # print(f"Agent {agent.id} - Action: {action}, State: {self.agent_states[agent.id]}, Targets: {self.agent_targets[agent.id]}")
-            self.metrics.record_step_completion()
-        
-        
+
+        # Once per step: it already updates every agent's idle time
+        self.metrics.record_step_completion()
+
+        if out is not None:
+            out[:] = actions
+            return out
         return actions
     
     def _store_pre_charging_state(self, agent):
@@ -646,22 +651,21 @@ class WarehouseController:
         }
 
         # Store state-specific targets
-        if self.agent_states[agent.id] == "seek_shelf":
+        if self.agent_states[agent.id] == AgentState.SEEK_SHELF:
             if self.agent_targets.get(agent.id):
                 storage['targets'] = {
                     'shelf_location': self.agent_targets[agent.id]['position'],
                     'shelf_id': self.agent_targets[agent.id].get('id')  # Safe get with default
                 }
                 
-        elif self.agent_states[agent.id] == "deliver":
+        elif self.agent_states[agent.id] == AgentState.DELIVER:
             if agent.carrying_shelf:
                 storage['targets'] = {
-                    'goal_location': min(self.goal_locations, 
-                                    key=lambda g: abs(g[0]-agent.x) + abs(g[1]-agent.y)),
+                    'goal_location': self._closest_goal(agent),
                     'shelf_id': agent.carrying_shelf.id
                 }
                 
-        elif self.agent_states[agent.id] == "return_shelf":
+        elif self.agent_states[agent.id] == AgentState.RETURN_SHELF:
             if agent.carrying_shelf and agent.carrying_shelf.id in self.shelf_memory:
                 storage['targets'] = {
                     'shelf_origin': self.shelf_memory[agent.carrying_shelf.id],
@@ -671,59 +675,42 @@ class WarehouseController:
 
         self.pre_charging_data[agent.id] = storage
 
+    def _resume_plan(self, agent, target_pos, shelf_id=None):
+        """Retarget an agent after charging and queue a fresh plan toward the target"""
+        if shelf_id is None:
+            self.agent_targets[agent.id] = {'position': target_pos}
+        else:
+            self.agent_targets[agent.id] = {'id': shelf_id, 'position': target_pos}
+        # Calculate new movement sequence
+        movement_sequence = self.shelf_mover.calculate_movement(agent, target_pos)
+        if movement_sequence:
+            self._queue_plan(agent, movement_sequence)  # Only the tail is queued
+
     def _restore_pre_charging_state(self, agent):
         """Restore complete task context after charging"""
         if agent.id not in self.pre_charging_data:
-            self.agent_states[agent.id] = "seek_shelf"
+            self.agent_states[agent.id] = AgentState.SEEK_SHELF
             return
 
         data = self.pre_charging_data[agent.id]
         self.agent_states[agent.id] = data['state']
         
         # Clear any existing actions
-        self.last_actions[agent.id] = []
-        
-        # State-specific restoration
-        if data['state'] == "seek_shelf" and data['targets']:
-            shelf_id = data['targets']['shelf_id']
-            # Verify shelf still exists and is available
-            shelf = next((s for s in self.env.request_queue if s.id == shelf_id), None)
-            if shelf and not any(a.carrying_shelf == shelf for a in self.env.agents):
-                target_pos = data['targets']['shelf_location']
-                self.agent_targets[agent.id] = {
-                    'id': shelf_id,
-                    'position': target_pos
-                }
-                # Calculate new movement sequence
-                movement_sequence = self.shelf_mover.calculate_movement(agent, target_pos)
-                if movement_sequence:
-                    self.last_actions[agent.id] = movement_sequence[1:]
-                    
-        elif data['state'] == "deliver" and data['targets']:
-            shelf_id = data['targets']['shelf_id']
-            shelf = next((s for s in self.env.shelfs if s.id == shelf_id), None)
-            if shelf and any(a.carrying_shelf == shelf for a in self.env.agents if a.id == agent.id):
-                target_pos = data['targets']['goal_location']
-                self.agent_targets[agent.id] = {
-                    'position': target_pos
-                }
-                # Calculate new movement sequence
-                movement_sequence = self.shelf_mover.calculate_movement(agent, target_pos)
-                if movement_sequence:
-                    self.last_actions[agent.id] = movement_sequence[1:]
-                    
-        elif data['state'] == "return_shelf" and data['targets']:
-            shelf_id = data['targets']['shelf_id']
-            shelf = next((s for s in self.env.shelfs if s.id == shelf_id), None)
-            if shelf and any(a.carrying_shelf == shelf for a in self.env.agents if a.id == agent.id):
-                target_pos = data['targets']['shelf_origin']
-                self.agent_targets[agent.id] = {
-                    'position': target_pos
-                }
-                # Calculate new movement sequence
-                movement_sequence = self.shelf_mover.calculate_movement(agent, target_pos)
-                if movement_sequence:
-                    self.last_actions[agent.id] = movement_sequence[1:]
+        self.last_actions[agent.id] = deque()
+        
+        # State-specific restoration: pick the target, then replan toward it
+        targets = data['targets']
+        state = data['state']
+        if targets:
+            shelf_id = targets['shelf_id']
+            if state == AgentState.SEEK_SHELF:
+                # Verify shelf still exists and is available
+                if shelf_id in self.request_by_id and shelf_id not in self.carrier_by_shelf_id:
+                    self._resume_plan(agent, targets['shelf_location'], shelf_id)
+            elif state in (AgentState.DELIVER, AgentState.RETURN_SHELF):
+                if self.carrier_by_shelf_id.get(shelf_id) is agent:
+                    key = 'goal_location' if state == AgentState.DELIVER else 'shelf_origin'
+                    self._resume_plan(agent, targets[key])
 
         # print(f"Restored Agent {agent.id} to {data['state']} with targets: {data['targets']}")
         del self.pre_charging_data[agent.id]
@@ -733,11 +720,11 @@ class WarehouseController:
             self.renderer.close()
             self.renderer = None
 
-def run_simulation():
+def run_simulation(render=True):
     env = gym.make("rware-easy-1ag-v2")
     
     # Initialize the controller
-    controller = WarehouseController(env)
+    controller = WarehouseController(env, verbose=True)
     obs, info = env.reset()
     controller.initialize_and_verify(env)
 
@@ -748,17 +735,18 @@ def run_simulation():
         while True:  # Infinite loop until break condition
             
             # Check completion condition
-            if controller.metrics.get_successful_tasks().count >= max_deliveries:
+            if controller.metrics.successful_deliveries >= max_deliveries:
                 print(f"\nAll {max_deliveries} deliveries completed! Simulation ending.")
                 break
                 
             # Get and execute actions
             actions = controller.get_actions()
             obs, rewards, done, truncated, info = env.step(actions)
-            env.render()
+            if render:
+                env.render()
 
-            # Optional: Slow down the simulation
-            time.sleep(0.1)
+                # Slow down the simulation so it can be watched
+                time.sleep(0.1)
 
             controller.current_step = step
             step += 1  # Increment step counter
@@ -770,5 +758,15 @@ def run_simulation():
         controller.metrics.print_summary()
         env.close()
 
+def parse_args():
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--no_render",
+        action="store_true",
+        help="Run headless, without the viewer or the per-step delay",
+    )
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    run_simulation()
\ No newline at end of file
+    args = parse_args()
+    run_simulation(render=not args.no_render)
\ No newline at end of file
@@ -1,10 +1,20 @@
 import sys
 import os
+import heapq
+from collections import OrderedDict
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 
 from shared_functions.enums import Action
 from shared_functions.shelf_helper import ShelfHelper
+from shared_functions.movement_tables import (
+    STEP_X, STEP_Y, TURN_LEFT, TURN_RIGHT, TURN_TABLE, DIRECTION_NAMES, ACTION_NAMES
+)
+
+# Bound on memoised A* results (see _pathfind_movement)
+PATH_CACHE_SIZE = 1024
+
+_F, _L, _R = Action.FORWARD.value, Action.LEFT.value, Action.RIGHT.value
 
 class ShelfCarryingMovement:
     def __init__(self, env, agent_states_ref=None):
@@ -19,11 +29,11 @@ class ShelfCarryingMovement:
         
         # Initialize shelf helper
         self.shelf_helper = ShelfHelper(env, agent_states_ref)
-        
-        self.direction_map = {0: 'UP', 1: 'DOWN', 2: 'LEFT', 3: 'RIGHT'}
-        self.action_names = {
-            0: 'NOOP', 1: 'FORWARD', 2: 'LEFT', 3: 'RIGHT', 4: 'TOGGLE_LOAD'
-        }
+        # Packed cell x * rows + y -> (x, y), and each cell's in-bounds neighbours
+        self.cell_coords = [(x, y) for x in range(self.cols) for y in range(self.rows)]
+        self.neighbor_table = self._build_neighbor_table()
+        # (start, heading, goal, blocked mask bytes) -> A* actions, least recently used first
+        self.path_cache = OrderedDict()
 
 
     def calculate_movement(self, agent, goal_pos, shelf_width=1, shelf_height=1):
@@ -32,26 +42,31 @@ class ShelfCarryingMovement:
         current_pos = (int(agent.x), int(agent.y))
         goal_pos = (int(goal_pos[0]), int(goal_pos[1]))
         
+        # Already there: every branch below would end in an empty plan
+        if current_pos == goal_pos:
+            return []
+        
         if self.debug:
             print(f"\n=== Starting Movement Calculation ===")
-            print(f"Agent Start: {current_pos}, Facing: {self.direction_map[agent.dir.value]}")
+            print(f"Agent Start: {current_pos}, Facing: {DIRECTION_NAMES[agent.dir.value]}")
             print(f"Goal Position: {goal_pos}")
             print(f"Shelf Size: {shelf_width}x{shelf_height}")
 
-        # Get blocked positions (keep your existing code)
-        blocked = self.shelf_helper.get_blocked_positions(agent, shelf_width, shelf_height)
+        # Flat per-cell view of blocked, shared by the direct-path check and A*
+        blocked_mask = self.shelf_helper.get_blocked_mask(agent)
         # self.shelf_helper.print_warehouse_map(agent)
         if self.debug:
-            print(f"Blocked positions count: {len(blocked)}")
-            if len(blocked) < 20:
-                print(f"Blocked positions: {sorted(blocked)}")
+            blocked_count = blocked_mask.count(1)
+            print(f"Blocked positions count: {blocked_count}")
+            if blocked_count < 20:
+                print(f"Blocked positions: {sorted(self.cell_coords[i] for i, b in enumerate(blocked_mask) if b)}")
 
         # Goal validation (keep your existing code)
         if not self._is_position_valid(goal_pos):
             if self.debug:
                 print(f"❌ Invalid goal position: {goal_pos} (Grid size: {self.rows}x{self.cols})")
             return []
-        elif goal_pos in blocked:
+        elif blocked_mask[goal_pos[0] * self.rows + goal_pos[1]]:
             if self.debug:
                 print(f"❌ Goal position blocked: {goal_pos}")
             return []
@@ -60,17 +75,17 @@ class ShelfCarryingMovement:
                 print(f"✅ Goal position valid and not blocked")
 
         # Enhanced direct path checking with full validation
-        direct_clear = self._is_direct_path_clear(current_pos, goal_pos, blocked, shelf_width, shelf_height)
+        direct_clear = self._is_direct_path_clear(current_pos, goal_pos, blocked_mask, shelf_width, shelf_height)
         if self.debug:
             print(f"Direct path clear: {direct_clear}")
         
         if direct_clear:
-            actions = self._direct_movement(agent, goal_pos)
+            actions = self._direct_movement(agent, current_pos, goal_pos)
             if self.debug:
-                print(f"Direct movement actions: {[self.action_names[a] for a in actions]}")
+                print(f"Direct movement actions: {[ACTION_NAMES[a] for a in actions]}")
             
             # NEW: Validate the entire action sequence
-            if self._validate_action_sequence(agent, actions, blocked):
+            if self._validate_action_sequence(agent, current_pos, actions, blocked_mask):
                 if self.debug:
                     print("✅ Direct path validated")
                 return actions
@@ -83,11 +98,11 @@ class ShelfCarryingMovement:
         if not direct_clear:
             if self.debug:
                 print("Attempting A* pathfinding...")
-            actions = self._pathfind_movement(agent, goal_pos, blocked)
+            actions = self._pathfind_movement(agent, current_pos, goal_pos, blocked_mask)
             # print(actions)
             if actions:
                 # NEW: Validate A* path
-                if self._validate_action_sequence(agent, actions, blocked):
+                if self._validate_action_sequence(agent, current_pos, actions, blocked_mask):
                     if self.debug:
                         print(f"✅ A* found valid path with {len(actions)} actions")
                     return actions
@@ -102,43 +117,23 @@ class ShelfCarryingMovement:
         return []
 
 
-    def _validate_action_sequence(self, agent, actions, blocked):
+    def _validate_action_sequence(self, agent, start_pos, actions, blocked_mask):
         """Proper validation that tracks position AND direction after each action"""
-        x, y = int(agent.x), int(agent.y)
+        rows, cols = self.rows, self.cols
+        x, y = start_pos
         direction = agent.dir.value
         
         for action in actions:
-            # print(f"Current: ({x},{y}) facing {direction} | Action: {action}")
-            
-            if action == Action.FORWARD.value:
-                # Calculate new position based on CURRENT direction
-                new_x, new_y = x, y
-                if direction == 0: new_y -= 1    # UP
-                elif direction == 1: new_y += 1  # DOWN
-                elif direction == 2: new_x -= 1  # LEFT
-                elif direction == 3: new_x += 1  # RIGHT
-                
-                # Check new position
-                if not self._is_position_valid((new_x, new_y)) or (new_x, new_y) in blocked:
-                    # print(f"Collision at ({new_x},{new_y}) - Blocked: {(new_x,new_y) in blocked}")
+            if action == _F:
+                # Move along the CURRENT direction; the new cell must be in bounds and free
+                x += STEP_X[direction]
+                y += STEP_Y[direction]
+                if not (0 <= x < cols and 0 <= y < rows) or blocked_mask[x * rows + y]:
                     return False
-                    
-                # Update position after successful move
-                x, y = new_x, new_y
-                
-            elif action in (Action.LEFT.value, Action.RIGHT.value):
-                # First verify we're not blocked at current position
-                # if (x, y) in blocked:
-                #     print(f"Turn blocked at current position ({x},{y})")
-                #     return False
-                    
-                # Update direction
-                if action == Action.LEFT.value:
-                    direction = {0:2, 1:3, 2:1, 3:0}[direction]
-                else:
-                    direction = {0:3, 1:2, 2:0, 3:1}[direction]
-                
-                # print(f"New direction: {direction}")
+            elif action == _L:
+                direction = TURN_LEFT[direction]
+            elif action == _R:
+                direction = TURN_RIGHT[direction]
         
         return True
 
@@ -148,134 +143,133 @@ class ShelfCarryingMovement:
         x, y = pos
         return 0 <= x < self.cols and 0 <= y < self.rows
 
-    def _is_direct_path_clear(self, start, end, blocked, shelf_width=1, shelf_height=1):
+    def _is_direct_path_clear(self, start, end, blocked_mask, shelf_width=1, shelf_height=1):
         """More thorough path clearance checking"""
         x1, y1 = start
         x2, y2 = end
+        rows = self.rows
         
-        # Check each step along the path
-        if x1 != x2:  # Horizontal movement
-            step = 1 if x2 > x1 else -1
-            for x in range(x1, x2, step):
-                if (x, y1) in blocked:
-                    return False
+        # Each leg is one strided slice of the packed mask (cell = x * rows + y)
+        if x1 != x2:  # Horizontal movement, x1 up to but excluding x2 along y1
+            step = rows if x2 > x1 else -rows
+            if 1 in blocked_mask[x1 * rows + y1:x2 * rows + y1:step]:
+                return False
                     
-        if y1 != y2:  # Vertical movement
+        if y1 != y2:  # Vertical movement, y1 up to but excluding y2 along x2
             step = 1 if y2 > y1 else -1
-            for y in range(y1, y2, step):
-                if (x2, y) in blocked:
-                    return False
+            if 1 in blocked_mask[x2 * rows + y1:x2 * rows + y2:step]:
+                return False
                     
         return True
 
-    def _direct_movement(self, agent, goal_pos):
+    def _direct_movement(self, agent, start_pos, goal_pos):
         """Calculate direct Manhattan movement sequence"""
-        current_x, current_y = int(agent.x), int(agent.y)
+        current_x, current_y = start_pos
         target_x, target_y = goal_pos
-        actions = []
-        
-        current_dir = agent.dir.value
-        current_dir_name = self.direction_map[current_dir]
         
         dx = target_x - current_x
         dy = target_y - current_y
         
-        # Determine primary movement axis
-        primary_axis = 'x' if abs(dx) > abs(dy) else 'y'
+        # One (distance, direction) leg per axis, primary (longer) axis first
+        x_leg = (dx, 3 if dx > 0 else 2)  # RIGHT or LEFT
+        y_leg = (dy, 1 if dy > 0 else 0)  # DOWN or UP
+        legs = (x_leg, y_leg) if abs(dx) > abs(dy) else (y_leg, x_leg)
         
-        if primary_axis == 'x':
-            if dx != 0:
-                desired_dir = 3 if dx > 0 else 2  # RIGHT or LEFT
-                if current_dir != desired_dir:
-                    actions += self._turn_to_face(current_dir, desired_dir)
-                    current_dir = desired_dir
-                
-                for _ in range(abs(dx)):
-                    actions.append(Action.FORWARD.value)
-            
-            if dy != 0:
-                desired_dir = 1 if dy > 0 else 0  # DOWN or UP
-                if current_dir != desired_dir:
-                    actions += self._turn_to_face(current_dir, desired_dir)
-                    current_dir = desired_dir
-                
-                for _ in range(abs(dy)):
-                    actions.append(Action.FORWARD.value)
-        else:
-            if dy != 0:
-                desired_dir = 1 if dy > 0 else 0  # DOWN or UP
-                if current_dir != desired_dir:
-                    actions += self._turn_to_face(current_dir, desired_dir)
-                    current_dir = desired_dir
-                
-                for _ in range(abs(dy)):
-                    actions.append(Action.FORWARD.value)
-            
-            if dx != 0:
-                desired_dir = 3 if dx > 0 else 2  # RIGHT or LEFT
-                if current_dir != desired_dir:
-                    actions += self._turn_to_face(current_dir, desired_dir)
-                    current_dir = desired_dir
-                
-                for _ in range(abs(dx)):
-                    actions.append(Action.FORWARD.value)
+        actions = []
+        current_dir = agent.dir.value
+        for distance, desired_dir in legs:
+            if distance:
+                actions += TURN_TABLE[current_dir * 4 + desired_dir]
+                current_dir = desired_dir
+                actions += [Action.FORWARD.value] * abs(distance)
         
         return actions
 
-    def _pathfind_movement(self, agent, goal_pos, blocked):
-        """A* pathfinding implementation"""
+    def _pathfind_movement(self, agent, start_pos, goal_pos, blocked_mask):
+        """A* pathfinding, memoised on everything the search reads"""
+        key = (start_pos, agent.dir.value, goal_pos, bytes(blocked_mask))
+        cache = self.path_cache
+        actions = cache.get(key)
+        if actions is None:
+            actions = tuple(self._astar_search(agent, start_pos, goal_pos, blocked_mask))
+            cache[key] = actions
+            if len(cache) > PATH_CACHE_SIZE:
+                cache.popitem(last=False)
+        else:
+            cache.move_to_end(key)
+        return list(actions)
 
+    def _astar_search(self, agent, start_pos, goal_pos, blocked_mask):
+        """A* pathfinding implementation"""
+        rows = self.rows
+        n_cells = self.cols * rows
+        neighbor_table = self.neighbor_table
+        cell_coords = self.cell_coords
         
-        start_pos = (int(agent.x), int(agent.y))
         start_dir = agent.dir.value
+        goal_x, goal_y = goal_pos
+        
+        # Cells are packed as x * rows + y, so per-node state lives in flat lists
+        start = start_pos[0] * rows + start_pos[1]
+        goal = goal_x * rows + goal_y
         
         # A* algorithm setup
-        open_set = []
-        closed_set = set()
-        came_from = {}
+        closed = bytearray(n_cells)  # 1 once a cell has been expanded
+        came_from = [-1] * n_cells
         
         # g_score[node] = cost from start to node
-        g_score = {start_pos: 0}
+        g_score = [float('inf')] * n_cells
+        g_score[start] = 0
         
         # f_score[node] = g_score[node] + h(node)
-        f_score = {start_pos: self._heuristic(start_pos, goal_pos)}
+        f_score = [0] * n_cells
+        f_score[start] = self._heuristic(start_pos, goal_pos)
         
-        open_set.append(start_pos)
+        # Heap entries are (f, first-push order, cell): equal f pops in discovery order.
+        # Improved nodes are pushed again and their stale entries skipped on pop.
+        push_order = [-1] * n_cells
+        push_order[start] = 0
+        pushed = 1
+        open_heap = [(f_score[start], 0, start)]
         
-        while open_set:
-            current = min(open_set, key=lambda pos: f_score.get(pos, float('inf')))
+        while open_heap:
+            f, _, current = heapq.heappop(open_heap)
+            if closed[current] or f != f_score[current]:
+                continue
             
-            if current == goal_pos:
+            if current == goal:
                 # Reconstruct path
                 path = []
-                while current in came_from:
+                while came_from[current] != -1:
                     current = came_from[current]
-                    path.append(current)
+                    path.append(cell_coords[current])
                 path.reverse()
                 
                 if not path:
                     return []
                 
                 # Convert path to actions
-                return self._convert_path_to_actions(agent, path)
+                return self._convert_path_to_actions(agent, start_pos, path)
             
-            open_set.remove(current)
-            closed_set.add(current)
+            closed[current] = 1
             
-            for neighbor in self._get_neighbors(current):
-                if neighbor in closed_set or neighbor in blocked:
+            for neighbor in neighbor_table[current]:
+                if closed[neighbor] or blocked_mask[neighbor]:
                     continue
                 
                 tentative_g_score = g_score[current] + 1
                 
-                if neighbor not in open_set:
-                    open_set.append(neighbor)
-                elif tentative_g_score >= g_score.get(neighbor, float('inf')):
+                if push_order[neighbor] < 0:
+                    push_order[neighbor] = pushed
+                    pushed += 1
+                elif tentative_g_score >= g_score[neighbor]:
                     continue
                 
                 came_from[neighbor] = current
                 g_score[neighbor] = tentative_g_score
-                f_score[neighbor] = g_score[neighbor] + self._heuristic(neighbor, goal_pos)
+                x, y = cell_coords[neighbor]
+                f_score[neighbor] = tentative_g_score + abs(x - goal_x) + abs(y - goal_y)
+                heapq.heappush(open_heap, (f_score[neighbor], push_order[neighbor], neighbor))
         
         return []  # No path found
 
@@ -283,26 +277,26 @@ class ShelfCarryingMovement:
         """Manhattan distance heuristic for A*"""
         return abs(pos[0] - goal[0]) + abs(pos[1] - goal[1])
 
-    def _get_neighbors(self, pos):
-        """Get valid neighboring positions"""
-        x, y = pos
-        neighbors = []
-        
-        for dx, dy in [(0, 1), (1, 0), (0, -1), (-1, 0)]:
-            new_x, new_y = x + dx, y + dy
-            if 0 <= new_x < self.cols and 0 <= new_y < self.rows:
-                neighbors.append((new_x, new_y))
-                
-        return neighbors
+    def _build_neighbor_table(self):
+        """Precompute the in-bounds neighbours of every packed cell (the grid never changes)"""
+        rows = self.rows
+        table = []
+        for x, y in self.cell_coords:
+            table.append(tuple(
+                (x + dx) * rows + (y + dy)
+                for dx, dy in [(0, 1), (1, 0), (0, -1), (-1, 0)]
+                if 0 <= x + dx < self.cols and 0 <= y + dy < rows
+            ))
+        return table
 
-    def _convert_path_to_actions(self, agent, path):
+    def _convert_path_to_actions(self, agent, start_pos, path):
         """Convert a path of positions to a sequence of actions"""
         if not path:
             return []
             
         actions = []
         current_dir = agent.dir.value
-        current_pos = (int(agent.x), int(agent.y))
+        current_pos = start_pos
         
         for next_pos in path:
             dx = next_pos[0] - current_pos[0]
@@ -333,26 +327,4 @@ class ShelfCarryingMovement:
 
     def _turn_to_face(self, current, desired):
         """Returns turn actions based on actual direction mapping"""
-        turn_map = {
-            # Current: {Desired: [actions]}
-            0: {1: [Action.LEFT.value, Action.LEFT.value],  # UP -> DOWN
-                2: [Action.LEFT.value],                     # UP -> LEFT
-                3: [Action.RIGHT.value]},                   # UP -> RIGHT
-                
-            1: {0: [Action.LEFT.value, Action.LEFT.value],  # DOWN -> UP
-                2: [Action.RIGHT.value],                    # DOWN -> LEFT
-                3: [Action.LEFT.value]},                    # DOWN -> RIGHT
-                
-            2: {0: [Action.RIGHT.value],                    # LEFT -> UP
-                1: [Action.LEFT.value],                     # LEFT -> DOWN
-                3: [Action.LEFT.value, Action.LEFT.value]}, # LEFT -> RIGHT
-                
-            3: {0: [Action.LEFT.value],                    # RIGHT -> UP
-                1: [Action.RIGHT.value],                   # RIGHT -> DOWN
-                2: [Action.LEFT.value, Action.LEFT.value]}  # RIGHT -> LEFT
-        }
-        
-        if current == desired:
-            return []
-        return turn_map[current][desired]
-    
\ No newline at end of file
+        return TURN_TABLE[current * 4 + desired]
@@ -2,31 +2,31 @@ import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+from argparse import ArgumentParser
 from collections import deque
 import time
+import numpy as np
 import gymnasium as gym
 import rware
 from rware.warehouse import RewardType, Warehouse
 from shelf_movement import ShelfCarryingMovement
 from shared_functions.warehouse_initializer import WarehouseInitializer
 from shared_functions.metrics_tracker import MetricsTracker
-from shared_functions.enums import Action
+from shared_functions.enums import Action, AgentState
 
 class WarehouseController:
-    def __init__(self, env):
+    def __init__(self, env, verbose=False):
         self.env = env.unwrapped
-        self.metrics = MetricsTracker() 
+        self.verbose = verbose  # Per-agent stuck/recovery messages
+        self.metrics = MetricsTracker(self.env.n_agents, verbose=verbose)
         
         # Initialize agent states
-        self.agent_states = {}  # "seek_shelf", "deliver", "return_shelf"
+        self.agent_states = {}  # AgentState per agent
         self.agent_targets = {}  # Current target for each agent
-        self.last_positions = {}
-        self.stuck_count = {}
         self.last_actions = {}
         self.agent_capacities = {}  # Track agent capacities
         self.shelf_weights = {}  # Track shelf weights
         self.current_step = 0  
-        self.in_recovery = {} 
         
         self.no_movement_steps = 0
         self.unreachable_shelves = set()  # Track shelves that can't be carried
@@ -35,11 +35,26 @@ class WarehouseController:
         # Initialize agent-specific data
         for agent in self.env.agents:
             self._init_agent_data(agent)
+        self._init_stuck_tracking()
 
         # Initialize shelf weights
         for shelf in self.env.request_queue:
             self.shelf_weights[shelf.id] = shelf.weight
 
+    def _init_stuck_tracking(self):
+        """Per-agent stuck bookkeeping as arrays indexed by ``agent.id - 1``"""
+        n_agents = len(self.env.agents)
+        self.last_positions = np.array(
+            [(int(agent.x), int(agent.y)) for agent in self.env.agents], dtype=np.int32
+        ).reshape(n_agents, 2)
+        self.stuck_count = np.zeros(n_agents, dtype=np.int32)
+        self.in_recovery = np.zeros(n_agents, dtype=bool)
+
+    def _init_unreachable(self):
+        """Per-agent unreachable flags, indexed by [agent.id - 1, shelf id]"""
+        n_shelf_ids = max((shelf.id for shelf in self.env.shelfs), default=0) + 1
+        self.unreachable = np.zeros((len(self.env.agents), n_shelf_ids), dtype=bool)
+
     def _all_agents_dead(self):
         """Check if all agents have depleted their batteries and aren't charging"""
         return all(agent.battery_level <= 0 and not agent.is_charging 
@@ -53,24 +68,39 @@ class WarehouseController:
         self.rows = initialization_data.rows
         self.cols = initialization_data.cols
         self.goal_locations = initialization_data.goal_locations
+        self.goal_array = np.array(list(self.goal_locations), dtype=int).reshape(-1, 2)
         self.shelf_locations = initialization_data.shelf_locations
         self.agent_locations = initialization_data.agent_locations
         self.shelf_memory = initialization_data.shelf_memory
         self.agent_states = initialization_data.agent_states
         self.shelf_memory = initialization_data.shelf_memory
         self.agent_targets = initialization_data.agent_targets
-        self.last_positions = initialization_data.last_positions
-        self.stuck_count = initialization_data.stuck_count
         self.last_actions = initialization_data.last_actions
+        self._init_stuck_tracking()
+        self._init_unreachable()
 
         self.shelf_mover = ShelfCarryingMovement(env, self.agent_states)
 
+    def _closest_goal(self, agent):
+        """Goal location nearest to the agent by Manhattan distance"""
+        dists = (np.abs(self.goal_array[:, 0] - agent.x) +
+                 np.abs(self.goal_array[:, 1] - agent.y))
+        x, y = self.goal_array[int(np.argmin(dists))]
+        return (int(x), int(y))
+
     def _get_aligned_position(self, pos):
         """Ensure position is within grid bounds"""
         x = max(0, min(int(pos[0]), self.cols-1))
         y = max(0, min(int(pos[1]), self.rows-1))
         return (x, y)
     
+    def _queue_plan(self, agent, movement_sequence):
+        """Queue a fresh plan in the agent's action deque and return its first action"""
+        queued = self.last_actions[agent.id]
+        queued.clear()
+        queued.extend(movement_sequence)
+        return queued.popleft()
+
     def _get_recovery_actions(self, agent):
         """Basic recovery actions when stuck"""
         recovery = []
@@ -94,41 +124,38 @@ class WarehouseController:
             else:
                 recovery = [Action.LEFT.value, Action.LEFT.value, Action.FORWARD.value]
         
-        return recovery
+        return deque(recovery)
 
     def _init_agent_data(self, agent):
         """Initialize all data structures for a new agent"""
-        self.agent_states[agent.id] = "seek_shelf"
+        self.agent_states[agent.id] = AgentState.SEEK_SHELF
         self.agent_targets[agent.id] = None
-        self.last_positions[agent.id] = (agent.x, agent.y)
-        self.stuck_count[agent.id] = 0
-        self.last_actions[agent.id] = []
+        self.last_actions[agent.id] = deque()
         self.agent_capacities[agent.id] = agent.max_carry_weight
-        # Define the unreachable_shelves set for this agent
-        agent.unreachable_shelves = set()
 
     def _can_carry_any_shelf(self, agent):
         """Check if there are any shelves this agent could potentially carry"""
-        # First ensure the agent has the unreachable_shelves set
-        if not hasattr(agent, 'unreachable_shelves'):
-            agent.unreachable_shelves = set()
-            
-        return any(
-            not any(a.carrying_shelf == shelf for a in self.env.agents) and
-            shelf.id not in agent.unreachable_shelves
-            for shelf in self.env.request_queue
-        )
+        return bool(self._available_shelf_mask(agent).any())
+
+    def _available_shelf_mask(self, agent):
+        """Boolean mask over the request queue of shelves this agent may target now"""
+        return ~self.queue_carried & ~self.unreachable[agent.id - 1, self.queue_ids]
     
     def _all_agents_stuck(self):
         """Check if all agents are currently stuck"""
-        return all(self.stuck_count.get(agent.id, 0) > 1 for agent in self.env.agents)
+        return bool((self.stuck_count > 1).all())
             
-    def get_actions(self):
-        any_movement = any(
-            (int(agent.x), int(agent.y)) != self.last_positions.get(agent.id, (-1, -1))
-            for agent in self.env.agents
-            if agent.battery_level > 0 and not agent.is_charging and self.agent_states[agent.id] != "no_shelf_to_carry"
-        )
+    def get_actions(self, out=None):
+        """Return one action per agent; written into ``out`` when a buffer is given"""
+        # Agent snapshot as arrays indexed by agent.id - 1 (nothing moves until env.step())
+        agents = self.env.agents
+        positions = np.array([(agent.x, agent.y) for agent in agents], dtype=np.int32).reshape(-1, 2)
+        active = np.array([
+            agent.battery_level > 0 and not agent.is_charging and
+            self.agent_states[agent.id] != AgentState.NO_SHELF_TO_CARRY
+            for agent in agents
+        ], dtype=bool)
+        any_movement = bool((active & (positions != self.last_positions).any(axis=1)).any())
         
         if any_movement:
             self.no_movement_steps = 0
@@ -138,63 +165,83 @@ class WarehouseController:
 
         self.metrics.record_total_steps()
 
+        # Request-queue and carried-shelf snapshot for shelf searches (fixed until env.step())
+        self.request_queue = list(self.env.request_queue)
+        carried_ids = {a.carrying_shelf.id for a in agents if a.carrying_shelf}
+        self.queue_ids = np.array([shelf.id for shelf in self.request_queue], dtype=np.intp)
+        self.queue_positions = np.array(
+            [(shelf.x, shelf.y) for shelf in self.request_queue], dtype=int
+        ).reshape(-1, 2)
+        # _get_aligned_position for the whole queue at once
+        np.clip(self.queue_positions, 0, (self.cols - 1, self.rows - 1), out=self.queue_positions)
+        self.queue_carried = np.array(
+            [shelf.id in carried_ids for shelf in self.request_queue], dtype=bool
+        )
+
         if self._all_agents_stuck():
             self.all_stuck_counter += 1
         else:
             self.all_stuck_counter = 0  # Reset if at least one agent is moving
 
-        for agent in self.env.agents:
-            self.metrics.record_movement(agent.id)
+        # Per-agent counters only touch each agent's own slot, so they can be bumped up front
+        self.metrics.record_all_movements()
+        for agent in agents:
             
             # Check if agent has no shelf to carry
-            if (self.agent_states[agent.id] not in ["deliver", "return_shelf"] and 
+            if (self.agent_states[agent.id] not in [AgentState.DELIVER, AgentState.RETURN_SHELF] and 
                 not self._can_carry_any_shelf(agent)):
-                self.agent_states[agent.id] = "no_shelf_to_carry"
+                self.agent_states[agent.id] = AgentState.NO_SHELF_TO_CARRY
                 self.agent_targets[agent.id] = None
-                self.last_actions[agent.id] = []
+                self.last_actions[agent.id] = deque()
             
-            if self.agent_states[agent.id] == "no_shelf_to_carry":
+            if self.agent_states[agent.id] == AgentState.NO_SHELF_TO_CARRY:
                 if self._can_carry_any_shelf(agent):
-                    self.agent_states[agent.id] = "seek_shelf"
+                    self.agent_states[agent.id] = AgentState.SEEK_SHELF
                 else:
                     actions.append(Action.NOOP.value)
                     continue
             
+            # Positions only change in env.step(), so one cast serves every branch below
             current_pos = (int(agent.x), int(agent.y))
+            idx = agent.id - 1
+            last_x, last_y = self.last_positions[idx]
+            stayed = current_pos == (last_x, last_y)
 
             # Check if agent is stuck
             if (self.last_actions.get(agent.id) and 
-                current_pos == self.last_positions.get(agent.id) and 
+                stayed and 
                 self.last_actions[agent.id][0] == Action.FORWARD.value):
-                self.stuck_count[agent.id] += 1
+                self.stuck_count[idx] += 1
             else:
-                self.stuck_count[agent.id] = 0
+                self.stuck_count[idx] = 0
 
-            if (self.stuck_count.get(agent.id, 0) > 1 and 
-                not self.agent_states[agent.id] == "no_shelf_to_carry" and 
-                not self.in_recovery.get(agent.id, False)):
-                print(f"Agent {agent.id} stuck at {current_pos}, initiating recovery...")
+            if (self.stuck_count[idx] > 1 and 
+                not self.agent_states[agent.id] == AgentState.NO_SHELF_TO_CARRY and 
+                not self.in_recovery[idx]):
+                if self.verbose:
+                    print(f"Agent {agent.id} stuck at {current_pos}, initiating recovery...")
                 self.metrics.record_collision(agent.id)
-                self.in_recovery[agent.id] = True
+                self.in_recovery[idx] = True
             
-            if self.in_recovery.get(agent.id) is True:
+            if self.in_recovery[idx]:
                 self.metrics.record_recovery_step(agent.id)
             
-            if (current_pos != self.last_positions.get(agent.id) and 
+            if (not stayed and 
                 self.last_actions.get(agent.id) and 
                 self.last_actions[agent.id][0] == Action.FORWARD.value and 
-                self.in_recovery.get(agent.id) is True):
-                print(f"Agent {agent.id} recovered from stuck state at {current_pos}")
-                self.stuck_count[agent.id] = 0
-                self.in_recovery[agent.id] = False
+                self.in_recovery[idx]):
+                if self.verbose:
+                    print(f"Agent {agent.id} recovered from stuck state at {current_pos}")
+                self.stuck_count[idx] = 0
+                self.in_recovery[idx] = False
                 self.metrics.record_recovery_complete(agent.id)
                 
-            self.last_positions[agent.id] = current_pos    
+            self.last_positions[idx] = current_pos    
             
             queued_actions = self.last_actions.get(agent.id, [])
             
             if queued_actions:
-                action = queued_actions.pop(0)
+                action = queued_actions.popleft()
                 actions.append(action)
                 continue
             
@@ -202,25 +249,19 @@ class WarehouseController:
             action = Action.NOOP.value
         
             # State: Seeking a shelf to pick up
-            if self.agent_states[agent.id] == "seek_shelf":
+            if self.agent_states[agent.id] == AgentState.SEEK_SHELF:
                 if not self.last_actions.get(agent.id) or \
-                   (int(agent.x), int(agent.y)) != (int(self.agent_targets[agent.id]['position'][0]), 
+                   current_pos != (int(self.agent_targets[agent.id]['position'][0]), 
                                                   int(self.agent_targets[agent.id]['position'][1])):
 
+                    # Skip shelves being carried or marked unreachable by this agent
                     closest_shelf = None
-                    min_dist = float('inf')
-                    
-                    for shelf in self.env.request_queue:
-                        # Skip if shelf is being carried or marked unreachable by this agent
-                        if (any(a.carrying_shelf == shelf for a in self.env.agents) or
-                            shelf.id in agent.unreachable_shelves):
-                            continue
-                            
-                        shelf_pos = self._get_aligned_position((shelf.x, shelf.y))
-                        dist = abs(shelf_pos[0]-agent.x) + abs(shelf_pos[1]-agent.y)
-                        if dist < min_dist:
-                            min_dist = dist
-                            closest_shelf = shelf
+                    candidates = self._available_shelf_mask(agent)
+                    if candidates.any():
+                        dists = (np.abs(self.queue_positions[:, 0] - agent.x) +
+                                 np.abs(self.queue_positions[:, 1] - agent.y))
+                        dists = np.where(candidates, dists, np.inf)
+                        closest_shelf = self.request_queue[int(np.argmin(dists))]
                     
                     if closest_shelf:
                         target_pos = self._get_aligned_position((closest_shelf.x, closest_shelf.y))
@@ -229,28 +270,27 @@ class WarehouseController:
                             'position': target_pos
                         }
 
-                        if closest_shelf and not (int(agent.x), int(agent.y)) == (int(closest_shelf.x), int(closest_shelf.y)):
+                        if closest_shelf and not current_pos == (int(closest_shelf.x), int(closest_shelf.y)):
                             self.metrics.record_task_start(agent.id, closest_shelf.id)
                         
                         movement_sequence = self.shelf_mover.calculate_movement(agent, target_pos)
                         
                         if movement_sequence:
-                            self.last_actions[agent.id] = movement_sequence[1:]
-                            action = movement_sequence[0]
+                            action = self._queue_plan(agent, movement_sequence)
                 
                 # When reached shelf position - check weight for THIS agent
-                if closest_shelf and (int(agent.x), int(agent.y)) == (int(closest_shelf.x), int(closest_shelf.y)):
+                if closest_shelf and current_pos == (int(closest_shelf.x), int(closest_shelf.y)):
                     if closest_shelf.weight <= agent.max_carry_weight:
                         action = Action.TOGGLE_LOAD.value
-                        self.agent_states[agent.id] = "deliver"
-                        self.last_actions[agent.id] = []
+                        self.agent_states[agent.id] = AgentState.DELIVER
+                        self.last_actions[agent.id] = deque()
                         # Clear from this agent's unreachable list
-                        agent.unreachable_shelves.discard(closest_shelf.id)
+                        self.unreachable[agent.id - 1, closest_shelf.id] = False
                     else:
                         # Add to THIS AGENT'S unreachable list only
-                        agent.unreachable_shelves.add(closest_shelf.id)
+                        self.unreachable[agent.id - 1, closest_shelf.id] = True
                         self.agent_targets[agent.id] = None
-                        self.last_actions[agent.id] = []
+                        self.last_actions[agent.id] = deque()
                         action = Action.NOOP.value
                         self.metrics.record_overcapacity_attempt(
                             agent.id, closest_shelf.id, 
@@ -258,9 +298,8 @@ class WarehouseController:
                         )
             
             # State: Delivering shelf to goal location
-            elif self.agent_states[agent.id] == "deliver" and agent.carrying_shelf:
-                closest_goal = min(self.goal_locations, 
-                                key=lambda g: abs(g[0]-agent.x) + abs(g[1]-agent.y))
+            elif self.agent_states[agent.id] == AgentState.DELIVER and agent.carrying_shelf:
+                closest_goal = self._closest_goal(agent)
                 
                 if agent.id in self.agent_targets:
                     self.agent_targets[agent.id]['position'] = closest_goal
@@ -268,16 +307,15 @@ class WarehouseController:
                 movement_sequence = self.shelf_mover.calculate_movement(agent, closest_goal)
                 
                 if movement_sequence:
-                    self.last_actions[agent.id] = movement_sequence[1:]
-                    action = movement_sequence[0]
+                    action = self._queue_plan(agent, movement_sequence)
                 
-                if (int(agent.x), int(agent.y)) == closest_goal:
+                if current_pos == closest_goal:
                     action = Action.TOGGLE_LOAD.value
-                    self.agent_states[agent.id] = "return_shelf"
-                    self.last_actions[agent.id] = []
+                    self.agent_states[agent.id] = AgentState.RETURN_SHELF
+                    self.last_actions[agent.id] = deque()
                     
             # State: Returning shelf to original position
-            elif self.agent_states[agent.id] == "return_shelf":
+            elif self.agent_states[agent.id] == AgentState.RETURN_SHELF:
                 if agent.carrying_shelf and agent.carrying_shelf.id in self.shelf_memory:
                     original_pos = self.shelf_memory[agent.carrying_shelf.id]
                     
@@ -287,23 +325,26 @@ class WarehouseController:
                     movement_sequence = self.shelf_mover.calculate_movement(agent, original_pos)
                     
                     if movement_sequence:
-                        self.last_actions[agent.id] = movement_sequence[1:]
-                        action = movement_sequence[0]
+                        action = self._queue_plan(agent, movement_sequence)
                     
-                    if (int(agent.x), int(agent.y)) == original_pos:
+                    if current_pos == original_pos:
                         action = Action.TOGGLE_LOAD.value
-                        self.agent_states[agent.id] = "seek_shelf"
+                        self.agent_states[agent.id] = AgentState.SEEK_SHELF
                         self.agent_targets[agent.id] = None
-                        self.last_actions[agent.id] = []
+                        self.last_actions[agent.id] = deque()
                         self.metrics.record_task_completion(agent.id, agent.carrying_shelf.id)
                 else:
-                    self.agent_states[agent.id] = "seek_shelf"
+                    self.agent_states[agent.id] = AgentState.SEEK_SHELF
                     self.agent_targets[agent.id] = None
-                    self.last_actions[agent.id] = []
+                    self.last_actions[agent.id] = deque()
             actions.append(action)
-        
-            self.metrics.record_step_completion()
-        
+
+        # Once per step: it already updates every agent's idle time
+        self.metrics.record_step_completion()
+
+        if out is not None:
+            out[:] = actions
+            return out
         return actions
     
     def close(self):
@@ -312,10 +353,10 @@ class WarehouseController:
             self.renderer = None
 
 
-def run_simulation():
+def run_simulation(render=True):
     env = gym.make("rware-easy-1ag-v2")
     env = env.unwrapped
-    controller = WarehouseController(env)
+    controller = WarehouseController(env, verbose=True)
     obs, info = env.reset()
     controller.initialize_and_verify(env)
 
@@ -325,9 +366,9 @@ def run_simulation():
     try:
         while True:            
             # Check completion conditions
-            if (controller.metrics.get_successful_tasks().count >= max_deliveries or 
-                controller._all_agents_dead()):
-                if controller._all_agents_dead():
+            all_dead = controller._all_agents_dead()  # One scan serves both checks below
+            if controller.metrics.successful_deliveries >= max_deliveries or all_dead:
+                if all_dead:
                     print("\nEMERGENCY STOP: All agents have depleted their batteries!")
                 else:
                     print(f"\nAll {max_deliveries} deliveries completed!")
@@ -339,9 +380,12 @@ def run_simulation():
             actions = controller.get_actions()
             obs, rewards, done, truncated, info = env.step(actions)
             controller.metrics.record_battery_levels(env.agents)
-            env.render()
+            if render:
+                env.render()
+
+                # Slow down the simulation so it can be watched
+                time.sleep(0.01)
 
-            time.sleep(0.01)
             controller.current_step = step
             step += 1
             
@@ -352,5 +396,15 @@ def run_simulation():
         controller.metrics.print_summary()
         env.close()
 
+def parse_args():
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--no_render",
+        action="store_true",
+        help="Run headless, without the viewer or the per-step delay",
+    )
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    run_simulation()
\ No newline at end of file
+    args = parse_args()
+    run_simulation(render=not args.no_render)
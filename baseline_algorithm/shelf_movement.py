@@ -3,9 +3,17 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 
-from collections import deque
+from collections import OrderedDict, deque
 from shared_functions.enums import Action
 from shared_functions.shelf_helper import ShelfHelper
+from shared_functions.movement_tables import (
+    STEP_X, STEP_Y, TURN_LEFT, TURN_RIGHT, TURN_TABLE, DIRECTION_NAMES
+)
+
+# Bound on memoised BFS results (see _pathfind_movement)
+PATH_CACHE_SIZE = 1024
+
+_F, _L, _R = Action.FORWARD.value, Action.LEFT.value, Action.RIGHT.value
 
 class ShelfCarryingMovement:
     def __init__(self, env, agent_states_ref=None):
@@ -20,11 +28,11 @@ class ShelfCarryingMovement:
         
         # Initialize shelf helper
         self.shelf_helper = ShelfHelper(env, agent_states_ref)
-        
-        self.direction_map = {0: 'UP', 1: 'DOWN', 2: 'LEFT', 3: 'RIGHT'}
-        self.action_names = {
-            0: 'NOOP', 1: 'FORWARD', 2: 'LEFT', 3: 'RIGHT', 4: 'TOGGLE_LOAD'
-        }
+        # Packed cell x * rows + y -> (x, y), and each cell's in-bounds neighbours
+        self.cell_coords = [(x, y) for x in range(self.cols) for y in range(self.rows)]
+        self.neighbor_table = self._build_neighbor_table()
+        # (start, heading, goal, blocked mask bytes) -> BFS actions, least recently used first
+        self.path_cache = OrderedDict()
 
     def calculate_movement(self, agent, goal_pos, shelf_width=1, shelf_height=1):
         current_pos = (int(agent.x), int(agent.y))
@@ -32,24 +40,25 @@ class ShelfCarryingMovement:
         
         if self.debug:
             print(f"\n=== Starting Movement Calculation ===")
-            print(f"Agent Start: {current_pos}, Facing: {self.direction_map[agent.dir.value]}")
+            print(f"Agent Start: {current_pos}, Facing: {DIRECTION_NAMES[agent.dir.value]}")
             print(f"Goal Position: {goal_pos}")
             print(f"Shelf Size: {shelf_width}x{shelf_height}")
 
-        # Get blocked positions
-        blocked = self.shelf_helper.get_blocked_positions(agent, shelf_width, shelf_height)
+        # Get blocked positions as a flat per-cell mask
+        blocked_mask = self.shelf_helper.get_blocked_mask(agent)
         
         if self.debug:
-            print(f"Blocked positions count: {len(blocked)}")
-            if len(blocked) < 20:
-                print(f"Blocked positions: {sorted(blocked)}")
+            blocked_count = blocked_mask.count(1)
+            print(f"Blocked positions count: {blocked_count}")
+            if blocked_count < 20:
+                print(f"Blocked positions: {sorted(self.cell_coords[i] for i, b in enumerate(blocked_mask) if b)}")
 
         # Goal validation
         if not self._is_position_valid(goal_pos):
             if self.debug:
                 print(f"❌ Invalid goal position: {goal_pos} (Grid size: {self.rows}x{self.cols})")
             return []
-        elif goal_pos in blocked:
+        elif blocked_mask[goal_pos[0] * self.rows + goal_pos[1]]:
             if self.debug:
                 print(f"❌ Goal position blocked: {goal_pos}")
             return []
@@ -57,10 +66,10 @@ class ShelfCarryingMovement:
         if self.debug:
             print("Attempting BFS pathfinding...")
         
-        actions = self._pathfind_movement(agent, goal_pos, blocked)
+        actions = self._pathfind_movement(agent, current_pos, goal_pos, blocked_mask)
         
         if actions:
-            if self._validate_action_sequence(agent, actions, blocked):
+            if self._validate_action_sequence(agent, current_pos, actions, blocked_mask):
                 if self.debug:
                     print(f"✅ BFS found valid path with {len(actions)} actions")
                 return actions
@@ -72,33 +81,23 @@ class ShelfCarryingMovement:
             print("❌ BFS failed to find valid path")
         return []
 
-    def _validate_action_sequence(self, agent, actions, blocked):
+    def _validate_action_sequence(self, agent, start_pos, actions, blocked_mask):
         """Proper validation that tracks position AND direction after each action"""
-        x, y = int(agent.x), int(agent.y)
+        rows, cols = self.rows, self.cols
+        x, y = start_pos
         direction = agent.dir.value
         
         for action in actions:
-            if action == Action.FORWARD.value:
-                # Calculate new position based on CURRENT direction
-                new_x, new_y = x, y
-                if direction == 0: new_y -= 1    # UP
-                elif direction == 1: new_y += 1  # DOWN
-                elif direction == 2: new_x -= 1  # LEFT
-                elif direction == 3: new_x += 1  # RIGHT
-                
-                # Check new position
-                if not self._is_position_valid((new_x, new_y)) or (new_x, new_y) in blocked:
+            if action == _F:
+                # Move along the CURRENT direction; the new cell must be in bounds and free
+                x += STEP_X[direction]
+                y += STEP_Y[direction]
+                if not (0 <= x < cols and 0 <= y < rows) or blocked_mask[x * rows + y]:
                     return False
-                    
-                # Update position after successful move
-                x, y = new_x, new_y
-                
-            elif action in (Action.LEFT.value, Action.RIGHT.value):
-                # Update direction
-                if action == Action.LEFT.value:
-                    direction = {0:2, 1:3, 2:1, 3:0}[direction]
-                else:
-                    direction = {0:3, 1:2, 2:0, 3:1}[direction]
+            elif action == _L:
+                direction = TURN_LEFT[direction]
+            elif action == _R:
+                direction = TURN_RIGHT[direction]
         
         return True
 
@@ -107,67 +106,90 @@ class ShelfCarryingMovement:
         x, y = pos
         return 0 <= x < self.cols and 0 <= y < self.rows
 
-    def _pathfind_movement(self, agent, goal_pos, blocked):
+    def _pathfind_movement(self, agent, start_pos, goal_pos, blocked_mask):
+        """BFS pathfinding, memoised on everything the search reads"""
+        key = (start_pos, agent.dir.value, goal_pos, bytes(blocked_mask))
+        cache = self.path_cache
+        actions = cache.get(key)
+        if actions is None:
+            actions = tuple(self._bfs_search(agent, start_pos, goal_pos, blocked_mask))
+            cache[key] = actions
+            if len(cache) > PATH_CACHE_SIZE:
+                cache.popitem(last=False)
+        else:
+            cache.move_to_end(key)
+        return list(actions)
+
+    def _bfs_search(self, agent, start_pos, goal_pos, blocked_mask):
         """BFS pathfinding implementation"""
-        start_pos = (int(agent.x), int(agent.y))
+        rows = self.rows
+        neighbor_table = self.neighbor_table
         
         if start_pos == goal_pos:
             return []
         
-        # BFS setup
-        queue = deque()
-        queue.append(start_pos)
-        visited = {start_pos: None}  # Tracks where we came from
+        # Cells are packed as x * rows + y, so BFS state lives in flat lists
+        start = start_pos[0] * rows + start_pos[1]
+        goal = goal_pos[0] * rows + goal_pos[1]
         
+        # parent[cell] tracks where we came from; -1 = unvisited, the start is its own parent
+        parent = [-1] * (self.cols * rows)
+        parent[start] = start
+        
+        # BFS queue as a list plus read index (each cell is enqueued at most once)
+        queue = [start]
+        head = 0
         found = False
         
-        while queue and not found:
-            current = queue.popleft()
+        while head < len(queue) and not found:
+            current = queue[head]
+            head += 1
             
-            for neighbor in self._get_neighbors(current):
-                if neighbor == goal_pos:
-                    visited[neighbor] = current
+            for neighbor in neighbor_table[current]:
+                if neighbor == goal:
+                    parent[neighbor] = current
                     found = True
                     break
                 
-                if neighbor not in visited and neighbor not in blocked:
-                    visited[neighbor] = current
+                if parent[neighbor] < 0 and not blocked_mask[neighbor]:
+                    parent[neighbor] = current
                     queue.append(neighbor)
         
         if not found:
             return []  # No path found
         
         # Reconstruct path
+        cell_coords = self.cell_coords
         path = []
-        current = goal_pos
-        while current != start_pos:
-            path.append(current)
-            current = visited[current]
+        current = goal
+        while current != start:
+            path.append(cell_coords[current])
+            current = parent[current]
         path.reverse()
         
         # Convert path to actions
-        return self._convert_path_to_actions(agent, path)
+        return self._convert_path_to_actions(agent, start_pos, path)
 
-    def _get_neighbors(self, pos):
-        """Get valid neighboring positions"""
-        x, y = pos
-        neighbors = []
-        
-        for dx, dy in [(0, 1), (1, 0), (0, -1), (-1, 0)]:
-            new_x, new_y = x + dx, y + dy
-            if 0 <= new_x < self.cols and 0 <= new_y < self.rows:
-                neighbors.append((new_x, new_y))
-                
-        return neighbors
+    def _build_neighbor_table(self):
+        """Precompute the in-bounds neighbours of every packed cell (the grid never changes)"""
+        rows = self.rows
+        table = []
+        for x, y in self.cell_coords:
+            table.append(tuple(
+                (x + dx) * rows + (y + dy)
+                for dx, dy in [(0, 1), (1, 0), (0, -1), (-1, 0)]
+                if 0 <= x + dx < self.cols and 0 <= y + dy < rows
+            ))
+        return table
 
-    def _convert_path_to_actions(self, agent, path):
+    def _convert_path_to_actions(self, agent, start_pos, path):
         """Convert a path of positions to a sequence of actions"""
         if not path:
             return []
             
         actions = []
         current_dir = agent.dir.value
-        current_pos = (int(agent.x), int(agent.y))
+        current_pos = start_pos
         
         for next_pos in path:
             dx = next_pos[0] - current_pos[0]
@@ -198,25 +220,4 @@ class ShelfCarryingMovement:
 
     def _turn_to_face(self, current, desired):
         """Returns turn actions based on actual direction mapping"""
-        turn_map = {
-            # Current: {Desired: [actions]}
-            0: {1: [Action.LEFT.value, Action.LEFT.value],  # UP -> DOWN
-                2: [Action.LEFT.value],                     # UP -> LEFT
-                3: [Action.RIGHT.value]},                   # UP -> RIGHT
-                
-            1: {0: [Action.LEFT.value, Action.LEFT.value],  # DOWN -> UP
-                2: [Action.RIGHT.value],                    # DOWN -> LEFT
-                3: [Action.LEFT.value]},                    # DOWN -> RIGHT
-                
-            2: {0: [Action.RIGHT.value],                    # LEFT -> UP
-                1: [Action.LEFT.value],                     # LEFT -> DOWN
-                3: [Action.LEFT.value, Action.LEFT.value]}, # LEFT -> RIGHT
-                
-            3: {0: [Action.LEFT.value],                    # RIGHT -> UP
-                1: [Action.RIGHT.value],                   # RIGHT -> DOWN
-                2: [Action.LEFT.value, Action.LEFT.value]}  # RIGHT -> LEFT
-        }
-        
-        if current == desired:
-            return []
-        return turn_map[current][desired]
\ No newline at end of file
+        return TURN_TABLE[current * 4 + desired]
@@ -9,9 +9,8 @@ import sys
 
 from gymnasium import error
 import numpy as np
-import six
 
-from rware.warehouse import Direction
+from rware.warehouse import Direction, _LAYER_SHELFS
 
 if "Apple" in sys.version:
     if "DYLD_FALLBACK_LIBRARY_PATH" in os.environ:
@@ -68,6 +67,12 @@ _GOAL_COLOR = (60, 60, 60)
 # Add to color constants at the top
 _CHARGING_STATION_COLOR = (100, 149, 237)  # Cornflower blue
 _SHELF_PADDING = 2
+# Unit heading offsets in pyglet coordinates (y up), indexed by Direction value
+_DIR_OFFSETS = np.zeros((len(Direction), 2))
+_DIR_OFFSETS[Direction.UP.value] = (0, 1)
+_DIR_OFFSETS[Direction.DOWN.value] = (0, -1)
+_DIR_OFFSETS[Direction.LEFT.value] = (-1, 0)
+_DIR_OFFSETS[Direction.RIGHT.value] = (1, 0)
 
 
 def get_display(spec):
@@ -77,7 +82,7 @@ def get_display(spec):
     """
     if spec is None:
         return None
-    elif isinstance(spec, six.string_types):
+    elif isinstance(spec, str):
         return pyglet.canvas.Display(spec)
     else:
         raise error.Error(
@@ -95,6 +100,16 @@ class Viewer(object):
         self.grid_size = 30
         self.icon_size = 20
 
+        # Agent hexagon as a triangle fan around the cell centre, computed once
+        resolution = 6
+        angles = 2 * math.pi * np.arange(resolution) / resolution
+        hexagon = (self.grid_size / 3) * np.stack([np.cos(angles), np.sin(angles)], axis=1)
+        fan = [(0, i, i + 1) for i in range(1, resolution - 1)]
+        self._agent_triangles = hexagon[np.ravel(fan)]
+
+        # Text labels reused across frames, keyed per entity (see _get_label)
+        self._labels = {}
+
         self.width = 1 + self.cols * (self.grid_size + 1)
         self.height = 2 + self.rows * (self.grid_size + 1)
         self.window = pyglet.window.Window(
@@ -106,6 +121,12 @@ class Viewer(object):
         glEnable(GL_BLEND)
         glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
 
+        # The grid never changes, so its lines live in one static batch (needs the window's GL context)
+        self._grid_batch = self._build_grid_batch()
+        # Goal boxes and labels, built on first render (see _draw_goals)
+        self._goal_batch = None
+        self._goal_key = None
+
     def close(self):
         self.window.close()
 
@@ -135,256 +156,296 @@ class Viewer(object):
         self._draw_agents(env)
 
         if return_rgb_array:
-            buffer = pyglet.image.get_buffer_manager().get_color_buffer()
-            image_data = buffer.get_image_data()
-            arr = np.frombuffer(image_data.get_data(), dtype=np.uint8)
-            arr = arr.reshape(buffer.height, buffer.width, 4)
-            arr = arr[::-1, :, 0:3]
+            # Read RGB straight into a fresh array (callers may keep frames), no RGBA bytes copy
+            width, height = self.window.get_framebuffer_size()
+            arr = np.empty((height, width, 3), dtype=np.uint8)
+            glPixelStorei(GL_PACK_ALIGNMENT, 1)
+            glReadBuffer(GL_BACK)
+            glReadPixels(0, 0, width, height, GL_RGB, GL_UNSIGNED_BYTE, arr.ctypes.data)
+            arr = arr[::-1]  # GL rows run bottom-up
         self.window.flip()
         return arr if return_rgb_array else self.isopen
 
-    def _draw_grid(self):
-        batch = pyglet.graphics.Batch()
-        # HORIZONTAL LINES
-        for r in range(self.rows + 1):
-            batch.add(
-                2,
-                gl.GL_LINES,
-                None,
-                (
-                    "v2f",
-                    (
-                        0,  # LEFT X
-                        (self.grid_size + 1) * r + 1,  # Y
-                        (self.grid_size + 1) * self.cols,  # RIGHT X
-                        (self.grid_size + 1) * r + 1,  # Y
-                    ),
-                ),
-                ("c3B", (*_GRID_COLOR, *_GRID_COLOR)),
+    def _get_label(self, key, text, x, y, font_name, font_size, bold, color):
+        """Return the centred Label cached under key, updating only what changed"""
+        label = self._labels.get(key)
+        if label is None:
+            label = pyglet.text.Label(
+                text,
+                font_name=font_name,
+                font_size=font_size,
+                bold=bold,
+                x=x,
+                y=y,
+                anchor_x="center",
+                anchor_y="center",
+                color=color,
             )
+            self._labels[key] = label
+        else:
+            # Each setter re-lays out the text, so skip unchanged values
+            if label.text != text:
+                label.text = text
+            if label.position != (x, y):
+                label.position = (x, y)
+        return label
+
+    def _build_grid_batch(self):
+        cell = self.grid_size + 1
+        # HORIZONTAL LINES: LEFT X, Y, RIGHT X, Y
+        r = np.arange(self.rows + 1)
+        horizontal = np.stack(
+            [np.zeros_like(r), cell * r + 1, np.full_like(r, cell * self.cols), cell * r + 1],
+            axis=1,
+        )
+        # VERTICAL LINES: X, BOTTOM Y, X, TOP Y
+        c = np.arange(self.cols + 1)
+        vertical = np.stack(
+            [cell * c + 1, np.zeros_like(c), cell * c + 1, np.full_like(c, cell * self.rows)],
+            axis=1,
+        )
+        verts = np.concatenate([horizontal, vertical]).ravel()
+        n_verts = len(verts) // 2
 
-        # VERTICAL LINES
-        for c in range(self.cols + 1):
-            batch.add(
-                2,
-                gl.GL_LINES,
-                None,
-                (
-                    "v2f",
-                    (
-                        (self.grid_size + 1) * c + 1,  # X
-                        0,  # BOTTOM Y
-                        (self.grid_size + 1) * c + 1,  # X
-                        (self.grid_size + 1) * self.rows,  # TOP Y
-                    ),
-                ),
-                ("c3B", (*_GRID_COLOR, *_GRID_COLOR)),
-            )
-        batch.draw()
+        batch = pyglet.graphics.Batch()
+        batch.add(
+            n_verts,
+            gl.GL_LINES,
+            None,
+            ("v2f/static", verts.tolist()),
+            ("c3B/static", n_verts * _GRID_COLOR),
+        )
+        return batch
+
+    def _draw_grid(self):
+        self._grid_batch.draw()
 
     def _draw_charging_stations(self, env):
-        batch = pyglet.graphics.Batch()
-        
-        for station in env.charge_stations:
-            x, y = station.x, station.y
-            y = self.rows - y - 1  # pyglet rendering is reversed
-            
-            # Draw charging station (lightning bolt symbol)
-            glColor3ub(*_CHARGING_STATION_COLOR)
-            
-            # Draw a simple lightning bolt shape
-            center_x = (self.grid_size + 1) * x + (self.grid_size + 1) / 2
-            center_y = (self.grid_size + 1) * y + (self.grid_size + 1) / 2
-            size = self.grid_size / 3
-            
-            glBegin(GL_TRIANGLES)
-            # Top triangle
-            glVertex2f(center_x, center_y + size)
-            glVertex2f(center_x - size/2, center_y)
-            glVertex2f(center_x + size/2, center_y)
-            # Bottom triangle
-            glVertex2f(center_x, center_y - size)
-            glVertex2f(center_x - size/2, center_y)
-            glVertex2f(center_x + size/2, center_y)
-            glEnd()
-            
-            # Draw border
-            glColor3ub(*_BLACK)
-            glLineWidth(1)
-            glBegin(GL_LINE_LOOP)
-            glVertex2f(center_x, center_y + size)
-            glVertex2f(center_x - size/2, center_y)
-            glVertex2f(center_x, center_y - size)
-            glVertex2f(center_x + size/2, center_y)
-            glEnd()
+        stations = env.charge_stations
+        if not stations:
+            return
+        n = len(stations)
+        cell = self.grid_size + 1
+        xs = np.array([station.x for station in stations])
+        ys = self.rows - np.array([station.y for station in stations]) - 1  # pyglet rendering is reversed
+
+        # Lightning-bolt corners of every station: top, left, bottom, right
+        center_x = cell * xs + cell / 2
+        center_y = cell * ys + cell / 2
+        size = self.grid_size / 3
+        top = np.stack([center_x, center_y + size], axis=1)
+        left = np.stack([center_x - size/2, center_y], axis=1)
+        bottom = np.stack([center_x, center_y - size], axis=1)
+        right = np.stack([center_x + size/2, center_y], axis=1)
+
+        # Draw charging stations (top and bottom triangle each) in one call
+        triangles = np.stack([top, left, right, bottom, left, right], axis=1)
+        pyglet.graphics.draw(
+            6 * n,
+            GL_TRIANGLES,
+            ("v2f", triangles.ravel().tolist()),
+            ("c3B", 6 * n * _CHARGING_STATION_COLOR),
+        )
 
-    def _draw_obstacles(self, env):
-        batch = pyglet.graphics.Batch()
-        
-        # Draw obstacles as solid rectangles
-        for y in range(env.obstacles.shape[0]):
-            for x in range(env.obstacles.shape[1]):
-                if env.obstacles[y, x]:
-                    # Convert to pyglet coordinates (y is inverted)
-                    pyglet_y = self.rows - y - 1
-                    
-                    batch.add(
-                        4,
-                        gl.GL_QUADS,
-                        None,
-                        (
-                            "v2f",
-                            (
-                                (self.grid_size + 1) * x + 1,  # TL - X
-                                (self.grid_size + 1) * pyglet_y + 1,  # TL - Y
-                                (self.grid_size + 1) * (x + 1),  # TR - X
-                                (self.grid_size + 1) * pyglet_y + 1,  # TR - Y
-                                (self.grid_size + 1) * (x + 1),  # BR - X
-                                (self.grid_size + 1) * (pyglet_y + 1),  # BR - Y
-                                (self.grid_size + 1) * x + 1,  # BL - X
-                                (self.grid_size + 1) * (pyglet_y + 1),  # BL - Y
-                            ),
-                        ),
-                        ("c3B", 4 * _OBSTACLE_COLOR),
-                    )
-        
-        batch.draw()
-        
-        # Draw obstacle borders
-        for y in range(env.obstacles.shape[0]):
-            for x in range(env.obstacles.shape[1]):
-                if env.obstacles[y, x]:
-                    pyglet_y = self.rows - y - 1
-                    
-                    glColor3ub(*_BLACK)
-                    glLineWidth(1)
-                    glBegin(GL_LINE_LOOP)
-                    glVertex2f((self.grid_size + 1) * x + 1,
-                            (self.grid_size + 1) * pyglet_y + 1)
-                    glVertex2f((self.grid_size + 1) * (x + 1),
-                            (self.grid_size + 1) * pyglet_y + 1)
-                    glVertex2f((self.grid_size + 1) * (x + 1),
-                            (self.grid_size + 1) * (pyglet_y + 1))
-                    glVertex2f((self.grid_size + 1) * x + 1,
-                            (self.grid_size + 1) * (pyglet_y + 1))
-                    glEnd()
+        # Draw borders as the four edges of every bolt
+        edges = np.stack([top, left, left, bottom, bottom, right, right, top], axis=1)
+        glLineWidth(1)
+        pyglet.graphics.draw(
+            8 * n,
+            GL_LINES,
+            ("v2f", edges.ravel().tolist()),
+            ("c3B", 8 * n * _BLACK),
+        )
 
-    def _draw_shelfs(self, env):
-        batch = pyglet.graphics.Batch()
+    def _draw_obstacles(self, env):
+        # Convert all obstacle cells to pyglet coordinates at once (y is inverted)
+        ys, xs = np.nonzero(env.obstacles)
+        if len(xs) == 0:
+            return
+        pyglet_ys = self.rows - ys - 1
+
+        cell = self.grid_size + 1
+        left = xs * cell + 1
+        right = (xs + 1) * cell
+        bottom = pyglet_ys * cell + 1
+        top = (pyglet_ys + 1) * cell
+
+        # Draw obstacles as solid rectangles: TL, TR, BR, BL per cell in one call
+        n = len(xs)
+        quads = np.stack(
+            [left, bottom, right, bottom, right, top, left, top], axis=1
+        ).ravel()
+        pyglet.graphics.draw(
+            4 * n,
+            GL_QUADS,
+            ("v2f", quads.tolist()),
+            ("c3B", 4 * n * _OBSTACLE_COLOR),
+        )
 
-        for shelf in env.shelfs:
-            x, y = shelf.x, shelf.y
-            y = self.rows - y - 1  # pyglet rendering is reversed
-            shelf_color = _SHELF_REQ_COLOR if shelf in env.request_queue else _SHELF_COLOR
+        # Draw obstacle borders as the four edges of every cell
+        edges = np.stack(
+            [left, bottom, right, bottom,
+             right, bottom, right, top,
+             right, top, left, top,
+             left, top, left, bottom],
+            axis=1,
+        ).ravel()
+        glLineWidth(1)
+        pyglet.graphics.draw(
+            8 * n,
+            GL_LINES,
+            ("v2f", edges.tolist()),
+            ("c3B", 8 * n * _BLACK),
+        )
 
-            # Draw the shelf (semi-transparent)
-            glEnable(GL_BLEND)
-            glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
-            glColor4ub(*shelf_color, 180)  # 180/255 alpha for transparency
-            
-            glBegin(GL_QUADS)
-            glVertex2f((self.grid_size + 1) * x + _SHELF_PADDING + 1,
-                    (self.grid_size + 1) * y + _SHELF_PADDING + 1)
-            glVertex2f((self.grid_size + 1) * (x + 1) - _SHELF_PADDING,
-                    (self.grid_size + 1) * y + _SHELF_PADDING + 1)
-            glVertex2f((self.grid_size + 1) * (x + 1) - _SHELF_PADDING,
-                    (self.grid_size + 1) * (y + 1) - _SHELF_PADDING)
-            glVertex2f((self.grid_size + 1) * x + _SHELF_PADDING + 1,
-                    (self.grid_size + 1) * (y + 1) - _SHELF_PADDING)
-            glEnd()
-            glDisable(GL_BLEND)
-
-            # Draw weight number (only for shelves in request queue)
-            if shelf in env.request_queue:
-                label_x = x * (self.grid_size + 1) + (1/2) * (self.grid_size + 1)
-                label_y = y * (self.grid_size + 1) + (1/2) * (self.grid_size + 1)
-                
-                weight_label = pyglet.text.Label(
-                    str(shelf.weight),
-                    font_name="Arial",
-                    font_size=10,
-                    bold=True,
-                    x=label_x,
-                    y=label_y,
-                    anchor_x="center",
-                    anchor_y="center",
-                    color=(*_BLACK, 255),  # Plain black text
-                )
-                weight_label.draw()
-
-        # Draw shelf borders
-        for shelf in env.shelfs:
-            x, y = shelf.x, shelf.y
-            y = self.rows - y - 1
-            
-            glColor3ub(*_BLACK)
-            glLineWidth(1)
-            glBegin(GL_LINE_LOOP)
-            glVertex2f((self.grid_size + 1) * x + _SHELF_PADDING + 1,
-                    (self.grid_size + 1) * y + _SHELF_PADDING + 1)
-            glVertex2f((self.grid_size + 1) * (x + 1) - _SHELF_PADDING,
-                    (self.grid_size + 1) * y + _SHELF_PADDING + 1)
-            glVertex2f((self.grid_size + 1) * (x + 1) - _SHELF_PADDING,
-                    (self.grid_size + 1) * (y + 1) - _SHELF_PADDING)
-            glVertex2f((self.grid_size + 1) * x + _SHELF_PADDING + 1,
-                    (self.grid_size + 1) * (y + 1) - _SHELF_PADDING)
-            glEnd()
+    def _draw_shelfs(self, env):
+        # The shelf layer of the grid already holds every shelf id at its (y, x) cell
+        layer = env.grid[_LAYER_SHELFS]
+        ys, xs = np.nonzero(layer)
+        n = len(xs)
+        if n == 0:
+            return
+        ids = layer[ys, xs]
+        is_requested = np.isin(ids, [shelf.id for shelf in env.request_queue])
+
+        cell = self.grid_size + 1
+        pad = _SHELF_PADDING
+        ys = self.rows - ys - 1  # pyglet rendering is reversed
+        left = cell * xs + pad + 1
+        right = cell * (xs + 1) - pad
+        bottom = cell * ys + pad + 1
+        top = cell * (ys + 1) - pad
+
+        # Draw all shelves (semi-transparent, 180/255 alpha) as one quad list under one blend state
+        quads = np.stack(
+            [left, bottom, right, bottom, right, top, left, top], axis=1
+        ).ravel()
+        colors = np.where(
+            is_requested[:, None], (*_SHELF_REQ_COLOR, 180), (*_SHELF_COLOR, 180)
+        )
+        glEnable(GL_BLEND)
+        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        pyglet.graphics.draw(
+            4 * n,
+            GL_QUADS,
+            ("v2f", quads.tolist()),
+            ("c4B", np.repeat(colors, 4, axis=0).ravel().tolist()),
+        )
+        glDisable(GL_BLEND)
+
+        # Draw weight number (only for shelves in request queue)
+        shelfs = env.shelfs
+        for k in np.flatnonzero(is_requested):
+            shelf = shelfs[ids[k] - 1]  # shelf ids are dense from 1
+            weight_label = self._get_label(
+                ("shelf", shelf.id),
+                str(shelf.weight),
+                x=float(xs[k] * cell + (1/2) * cell),
+                y=float(ys[k] * cell + (1/2) * cell),
+                font_name="Arial",
+                font_size=10,
+                bold=True,
+                color=(*_BLACK, 255),  # Plain black text
+            )
+            weight_label.draw()
+
+        # Draw shelf borders as the four edges of every shelf
+        edges = np.stack(
+            [left, bottom, right, bottom,
+             right, bottom, right, top,
+             right, top, left, top,
+             left, top, left, bottom],
+            axis=1,
+        ).ravel()
+        glLineWidth(1)
+        pyglet.graphics.draw(
+            8 * n,
+            GL_LINES,
+            ("v2f", edges.tolist()),
+            ("c3B", 8 * n * _BLACK),
+        )
 
     def _draw_goals(self, env):
+        # Goals are fixed by the layout, so rebuild the batch only when they change
+        key = tuple(env.goals)
+        if key != self._goal_key:
+            self._goal_batch = self._build_goal_batch(env.goals)
+            self._goal_key = key
+        self._goal_batch.draw()
+
+    def _build_goal_batch(self, goals):
         batch = pyglet.graphics.Batch()
+        # Boxes first, labels on top
+        background = pyglet.graphics.OrderedGroup(0)
+        foreground = pyglet.graphics.OrderedGroup(1)
+        cell = self.grid_size + 1
 
-        # draw goal boxes
-        for goal in env.goals:
+        for goal in goals:
             x, y = goal
             y = self.rows - y - 1  # pyglet rendering is reversed
+
+            # draw goal box
             batch.add(
                 4,
                 gl.GL_QUADS,
-                None,
+                background,
                 (
-                    "v2f",
+                    "v2f/static",
                     (
-                        (self.grid_size + 1) * x + 1,  # TL - X
-                        (self.grid_size + 1) * y + 1,  # TL - Y
-                        (self.grid_size + 1) * (x + 1),  # TR - X
-                        (self.grid_size + 1) * y + 1,  # TR - Y
-                        (self.grid_size + 1) * (x + 1),  # BR - X
-                        (self.grid_size + 1) * (y + 1),  # BR - Y
-                        (self.grid_size + 1) * x + 1,  # BL - X
-                        (self.grid_size + 1) * (y + 1),  # BL - Y
+                        cell * x + 1,  # TL - X
+                        cell * y + 1,  # TL - Y
+                        cell * (x + 1),  # TR - X
+                        cell * y + 1,  # TR - Y
+                        cell * (x + 1),  # BR - X
+                        cell * (y + 1),  # BR - Y
+                        cell * x + 1,  # BL - X
+                        cell * (y + 1),  # BL - Y
                     ),
                 ),
-                ("c3B", 4 * _GOAL_COLOR),
+                ("c3B/static", 4 * _GOAL_COLOR),
             )
-        batch.draw()
 
-        # draw goal labels
-        for goal in env.goals:
-            x, y = goal
-            y = self.rows - y - 1
-            label_x = x * (self.grid_size + 1) + (1 / 2) * (self.grid_size + 1)
-            label_y = (self.grid_size + 1) * y + (1 / 2) * (self.grid_size + 1)
-            label = pyglet.text.Label(
+            # draw goal label
+            pyglet.text.Label(
                 "G",
                 font_name="Calibri",
                 font_size=18,
                 bold=False,
-                x=label_x,
-                y=label_y,
+                x=x * cell + (1 / 2) * cell,
+                y=cell * y + (1 / 2) * cell,
                 anchor_x="center",
                 anchor_y="center",
                 color=(*_WHITE, 255),
+                batch=batch,
+                group=foreground,
             )
-            label.draw()
+        return batch
 
     def _draw_agents(self, env):
-        agents = []
-        batch = pyglet.graphics.Batch()
-
         radius = self.grid_size / 3
-        resolution = 6
 
-        for agent in env.agents:
+        # Draw every agent circle in one call (change color if charging)
+        agent_list = env.agents
+        cell = self.grid_size + 1
+        centers = np.array(
+            [(cell * agent.x, cell * (self.rows - agent.y - 1)) for agent in agent_list],
+            dtype=float,
+        ).reshape(-1, 2) + (self.grid_size // 2 + 1)
+        draw_colors = [
+            _GREEN if agent.is_charging  # Green when charging
+            else _AGENT_LOADED_COLOR if agent.carrying_shelf else _AGENT_COLOR
+            for agent in agent_list
+        ]
+        n_verts = len(self._agent_triangles)
+        verts = centers[:, None, :] + self._agent_triangles[None, :, :]
+        pyglet.graphics.draw(
+            n_verts * len(agent_list),
+            GL_TRIANGLES,
+            ("v2f", verts.ravel().tolist()),
+            ("c3B", np.repeat(draw_colors, n_verts, axis=0).ravel().tolist()),
+        )
+
+        for agent in agent_list:
             col, row = agent.x, agent.y
             row = self.rows - row - 1  # pyglet rendering is reversed
 
@@ -397,8 +458,8 @@ class Viewer(object):
             # Draw battery outline (below agent)
             battery_width = self.grid_size / 2
             battery_height = self.grid_size / 10
-            battery_x = (self.grid_size + 1) * col + (self.grid_size + 1 - battery_width) / 2
-            battery_y = (self.grid_size + 1) * row + self.grid_size / 10
+            battery_x = cell * col + (cell - battery_width) / 2
+            battery_y = cell * row + self.grid_size / 10
             
             # Draw battery outline
             glColor3ub(*_BLACK)
@@ -430,118 +491,58 @@ class Viewer(object):
             glVertex2f(battery_x + 1, battery_y + battery_height - 1)
             glEnd()
 
-            # Draw agent circle (change color if charging)
-            if agent.is_charging:
-                draw_color = _GREEN  # Green when charging
-            else:
-                draw_color = _AGENT_LOADED_COLOR if agent.carrying_shelf else _AGENT_COLOR
-
-            # make a circle for the agent
-            verts = []
-            for i in range(resolution):
-                angle = 2 * math.pi * i / resolution
-                x = (
-                    radius * math.cos(angle)
-                    + (self.grid_size + 1) * col
-                    + self.grid_size // 2
-                    + 1
-                )
-                y = (
-                    radius * math.sin(angle)
-                    + (self.grid_size + 1) * row
-                    + self.grid_size // 2
-                    + 1
-                )
-                verts += [x, y]
-            circle = pyglet.graphics.vertex_list(resolution, ("v2f", verts))
-            glColor3ub(*draw_color)
-            circle.draw(GL_POLYGON)
-
             # Add numeric battery percentage label
-            battery_label_x = col * (self.grid_size + 1) + (self.grid_size + 1) / 2
-            battery_label_y = row * (self.grid_size + 1) + self.grid_size / 5 + battery_height
+            battery_label_x = col * cell + cell / 2
+            battery_label_y = row * cell + self.grid_size / 5 + battery_height
             
-            battery_label = pyglet.text.Label(
+            battery_label = self._get_label(
+                ("battery", agent.id),
                 f"{int(agent.battery_level)}",
+                x=battery_label_x,
+                y=battery_label_y,
                 font_name="Arial",
                 font_size=8,
                 bold=True,
-                x=battery_label_x,
-                y=battery_label_y,
-                anchor_x="center",
-                anchor_y="center",
                 color=(*_BLACK, 255),
             )
             battery_label.draw()
 
             # Add capacity label above agent
-            capacity_label_x = col * (self.grid_size + 1) + (self.grid_size + 1) / 2
-            capacity_label_y = row * (self.grid_size + 1) + 3 * (self.grid_size + 1) / 4
+            capacity_label_x = col * cell + cell / 2
+            capacity_label_y = row * cell + 3 * cell / 4
             
-            capacity_label = pyglet.text.Label(
+            capacity_label = self._get_label(
+                ("capacity", agent.id),
                 f"Cap:{agent.max_carry_weight}",
+                x=capacity_label_x,
+                y=capacity_label_y,
                 font_name="Arial",
                 font_size=8,
                 bold=True,
-                x=capacity_label_x,
-                y=capacity_label_y,
-                anchor_x="center",
-                anchor_y="center",
                 color=(*_BLACK, 255),
             )
             capacity_label.draw()
 
-        # Draw agent directions
-        for agent in env.agents:
-            col, row = agent.x, agent.y
-            row = self.rows - row - 1  # pyglet rendering is reversed
-
-            batch.add(
-                2,
-                gl.GL_LINES,
-                None,
-                (
-                    "v2f",
-                    (
-                        (self.grid_size + 1) * col
-                        + self.grid_size // 2
-                        + 1,  # CENTER X
-                        (self.grid_size + 1) * row
-                        + self.grid_size // 2
-                        + 1,  # CENTER Y
-                        (self.grid_size + 1) * col
-                        + self.grid_size // 2
-                        + 1
-                        + (
-                            radius if agent.dir.value == Direction.RIGHT.value else 0
-                        )  # DIR X
-                        + (
-                            -radius if agent.dir.value == Direction.LEFT.value else 0
-                        ),  # DIR X
-                        (self.grid_size + 1) * row
-                        + self.grid_size // 2
-                        + 1
-                        + (
-                            radius if agent.dir.value == Direction.UP.value else 0
-                        )  # DIR Y
-                        + (
-                            -radius if agent.dir.value == Direction.DOWN.value else 0
-                        ),  # DIR Y
-                    ),
-                ),
-                ("c3B", (*_AGENT_DIR_COLOR, *_AGENT_DIR_COLOR)),
-            )
-        batch.draw()
+        # Draw agent directions: centre to the rim along each heading, all in one call
+        tips = centers + radius * _DIR_OFFSETS[[agent.dir.value for agent in agent_list]]
+        lines = np.stack([centers, tips], axis=1)
+        pyglet.graphics.draw(
+            2 * len(agent_list),
+            GL_LINES,
+            ("v2f", lines.ravel().tolist()),
+            ("c3B", 2 * len(agent_list) * _AGENT_DIR_COLOR),
+        )
 
     def _draw_badge(self, row, col, index):
         resolution = 6
         radius = self.grid_size / 5
+        cell = self.grid_size + 1
 
-        badge_x = col * (self.grid_size + 1) + (3 / 4) * (self.grid_size + 1)
+        badge_x = col * cell + (3 / 4) * cell
         badge_y = (
             self.height
-            - (self.grid_size + 1) * (row + 1)
-            + (1 / 4) * (self.grid_size + 1)
+            - cell * (row + 1)
+            + (1 / 4) * cell
         )
 
         # make a circle
@@ -556,15 +557,14 @@ class Viewer(object):
         circle.draw(GL_POLYGON)
         glColor3ub(*_BLACK)
         circle.draw(GL_LINE_LOOP)
-        label = pyglet.text.Label(
+        label = self._get_label(
+            ("badge", row, col),
             str(index),
+            x=badge_x,
+            y=badge_y + 2,
             font_name="Times New Roman",
             font_size=9,
             bold=True,
-            x=badge_x,
-            y=badge_y + 2,
-            anchor_x="center",
-            anchor_y="center",
             color=(*_BLACK, 255),
         )
         label.draw()
\ No newline at end of file
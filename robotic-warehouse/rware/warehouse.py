@@ -1113,6 +1113,7 @@ class Warehouse(gym.Env):
     def close(self):
         if self.renderer:
             self.renderer.close()
+            self.renderer = None
 
     def seed(self, seed=None):
         if seed is not None:
@@ -1,4 +1,4 @@
-from enum import Enum
+from enum import Enum, IntEnum
 
 class Action(Enum):
     NOOP = 0
@@ -11,4 +11,11 @@ class Direction(Enum):
     UP = 0
     DOWN = 1
     LEFT = 2
-    RIGHT = 3
\ No newline at end of file
+    RIGHT = 3
+
+class AgentState(IntEnum):
+    SEEK_SHELF = 0
+    DELIVER = 1
+    RETURN_SHELF = 2
+    CHARGING = 3
+    NO_SHELF_TO_CARRY = 4
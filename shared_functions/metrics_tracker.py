@@ -3,8 +3,52 @@ from collections import defaultdict
 import numpy as np
 from types import SimpleNamespace
 
+class _GrowBuf:
+    """Append-only NumPy buffer that doubles its capacity when full"""
+
+    __slots__ = ('buf', 'n')
+
+    def __init__(self, dtype, capacity=64):
+        self.buf = np.empty(capacity, dtype=dtype)
+        self.n = 0
+
+    def push(self, value):
+        if self.n == len(self.buf):
+            grown = np.empty(2 * len(self.buf), dtype=self.buf.dtype)
+            grown[:self.n] = self.buf
+            self.buf = grown
+        self.buf[self.n] = value
+        self.n += 1
+
+    def view(self):
+        """The filled part of the buffer (no copy)"""
+        return self.buf[:self.n]
+
+    def __len__(self):
+        return self.n
+
+
 class MetricsTracker:
-    def __init__(self):
+    # Fixed attribute set: every record_* call reads and writes these, so skip the instance dict
+    __slots__ = (
+        'n_agents', 'verbose',
+        'total_deliveries', 'successful_deliveries', 'failed_deliveries', 'completed_shelves',
+        'task_start_times', 'task_durations', 'task_step_counts', 'current_task_steps',
+        'total_steps', 'collision_count', 'recovery_steps', 'recovery_steps_count', 'in_recovery',
+        'all_stuck_events', 'max_stuck_duration',
+        'overcapacity_attempts', 'overcapacity_agents',
+        'low_battery_events', 'critical_battery_events', 'battery_failures', 'charging_time',
+        'charging_durations', 'charging_step_counts', 'charging_steps', 'discharged_agents',
+        'idle_time', 'last_active_time', 'has_been_active', 'total_distance', 'last_positions',
+        'optimal_path_lengths', 'actual_path_lengths', 'path_efficiency',
+        'start_time', 'last_step_time', 'step_time', '_task_means_cache', '_task_means_n',
+    )
+
+    def __init__(self, n_agents, verbose=False):
+        # Per-agent counters are arrays indexed by ``agent_id - 1`` (agent ids are dense from 1)
+        self.n_agents = n_agents
+        self.verbose = verbose  # Per-event collision/recovery messages
+
         # Delivery metrics
         self.total_deliveries = 0
         self.successful_deliveries = 0
@@ -13,20 +57,20 @@ class MetricsTracker:
         
         # Task timing metrics
         self.task_start_times = {}
-        self.task_durations = []
-        self.task_step_counts = []
-        self.current_task_steps = defaultdict(int)
+        self.task_durations = _GrowBuf(np.float64)
+        self.task_step_counts = _GrowBuf(np.int64)
+        self.current_task_steps = np.zeros(n_agents, dtype=np.int64)
         
         # Movement metrics
         self.total_steps = 0
         self.collision_count = 0
-        self.recovery_steps = defaultdict(int)
-        self.recovery_steps_count = []
-        self.in_recovery = defaultdict(bool)
+        self.recovery_steps = np.zeros(n_agents, dtype=np.int64)
+        self.recovery_steps_count = _GrowBuf(np.int64)
+        self.in_recovery = np.zeros(n_agents, dtype=bool)
         
         # Capacity metrics
         self.overcapacity_attempts = 0
-        self.overcapacity_agents = set()
+        self.overcapacity_agents = np.zeros(n_agents, dtype=bool)
         
 
         # Battery metrics
@@ -34,15 +78,16 @@ class MetricsTracker:
         self.critical_battery_events = 0
         self.battery_failures = 0
         self.charging_time = defaultdict(float)
-        self.charging_durations = [] 
-        self.charging_step_counts = [] 
-        self.charging_steps = defaultdict(int)  
-        self.discharged_agents = set()
+        self.charging_durations = _GrowBuf(np.float64)
+        self.charging_step_counts = _GrowBuf(np.int64)
+        self.charging_steps = np.zeros(n_agents, dtype=np.int64)
+        self.discharged_agents = np.zeros(n_agents, dtype=bool)
         
         # Efficiency metrics
-        self.idle_time = defaultdict(float)
-        self.last_active_time = defaultdict(float)
-        self.total_distance = defaultdict(float)
+        self.idle_time = np.zeros(n_agents, dtype=np.float64)
+        self.last_active_time = np.zeros(n_agents, dtype=np.float64)
+        self.has_been_active = np.zeros(n_agents, dtype=bool)  # Idle time accrues only after first activity
+        self.total_distance = np.zeros(n_agents, dtype=np.float64)
         self.last_positions = {}
         
         # Path metrics
@@ -51,13 +96,17 @@ class MetricsTracker:
         
         # Initialize timing
         self.start_time = time.time()
+        # Summary averages cached by task count, (0, 0) until a task completes (see _task_means)
+        self._task_means_cache = (0, 0)
+        self._task_means_n = 0
         self.last_step_time = self.start_time
+        # Clock read once per step (see record_total_steps) and shared by that step's events
+        self.step_time = self.start_time
 
     def record_battery_levels(self, agents):
         """Record current battery levels of all agents"""
-        for agent in agents:
-            if agent.battery_level <= 0:
-                self.battery_failures += 1
+        levels = np.fromiter((agent.battery_level for agent in agents), dtype=np.float64, count=len(agents))
+        self.battery_failures += int(np.count_nonzero(levels <= 0))
 
     # In your MetricsTracker class, add:
     def record_all_stuck(self, steps):
@@ -67,22 +116,28 @@ class MetricsTracker:
 
     def record_task_start(self, agent_id, shelf_id):
         """Record when an agent starts a new task"""
-        self.task_start_times[(agent_id, shelf_id)] = time.time()
-        self.current_task_steps[(agent_id)] = 0
-        self.last_active_time[agent_id] = time.time()
+        idx = agent_id - 1
+        self.task_start_times[(agent_id, shelf_id)] = self.step_time
+        self.current_task_steps[idx] = 0
+        self._mark_active(idx)
         
-    def record_movement(self, agent_id):
-        """Record movement-related metrics"""
-        self.current_task_steps[(agent_id)] += 1
-        self.last_active_time[agent_id] = time.time()
+    def record_all_movements(self):
+        """Record movement-related metrics for every agent at once (one array op per counter)"""
+        self.current_task_steps += 1
+        self._mark_active(slice(None))
 
-        # If agent is charging, count the step
-        if agent_id in self.charging_time:
-            self.charging_steps[agent_id] += 1
+        # Count the step for agents that are charging
+        for agent_id in self.charging_time:
+            self.charging_steps[agent_id - 1] += 1
+
+    def _mark_active(self, idx):
+        self.last_active_time[idx] = self.step_time
+        self.has_been_active[idx] = True
 
     def record_total_steps(self):
         """Record movement-related metrics"""
         self.total_steps += 1
+        self.step_time = time.time()
 
 
     def record_task_completion(self, agent_id, shelf_id):
@@ -92,52 +147,54 @@ class MetricsTracker:
             agent_id: ID of the agent completing the task
             shelf_id: ID of the shelf being delivered
         """
-        if (agent_id, shelf_id) not in self.task_start_times:
+        # One lookup both checks for and clears the task's start time
+        key = (agent_id, shelf_id)
+        start_time = self.task_start_times.pop(key, None)
+        if start_time is None:
             return
-        duration = time.time() - self.task_start_times[(agent_id, shelf_id)]
-        steps = self.current_task_steps[(agent_id)]
+        duration = self.step_time - start_time
+        steps = int(self.current_task_steps[agent_id - 1])
+        self.current_task_steps[agent_id - 1] = 0
         
-        self.task_durations.append(duration)
-        self.task_step_counts.append(steps)
+        self.task_durations.push(duration)
+        self.task_step_counts.push(steps)
         self.successful_deliveries += 1
         self.total_deliveries += 1
         self.completed_shelves.add(shelf_id)
         
         # Record path efficiency
-        optimal_length = self.optimal_path_lengths.get((agent_id, shelf_id), 0)
-        actual_length = self.actual_path_lengths.get((agent_id, shelf_id), 0)
+        optimal_length = self.optimal_path_lengths.get(key, 0)
+        actual_length = self.actual_path_lengths.get(key, 0)
         if optimal_length > 0:
             self.path_efficiency = actual_length / optimal_length
-        
-        # Clean up
-        del self.task_start_times[(agent_id, shelf_id)]
-        del self.current_task_steps[(agent_id)]
 
     def record_collision(self, agent_id):
         """Record a collision event"""
         self.collision_count += 1
-        self.in_recovery[agent_id] = True
-        print(f"Agent {agent_id} stuck!")
+        self.in_recovery[agent_id - 1] = True
+        if self.verbose:
+            print(f"Agent {agent_id} stuck!")
         
     def record_recovery_step(self, agent_id):
         """Record steps taken to recover from collision"""
-        if self.in_recovery.get(agent_id, False):
-            self.recovery_steps[agent_id] += 1
+        if self.in_recovery[agent_id - 1]:
+            self.recovery_steps[agent_id - 1] += 1
             
     def record_recovery_complete(self, agent_id):
         """Record when recovery from collision is complete"""
-        if agent_id in self.in_recovery:
-            
-            self.recovery_steps_count.append(self.recovery_steps[agent_id])
-            self.recovery_steps[agent_id] = 0  # Reset recovery steps for the next collision
-            print(f"Total recovery steps: {self.recovery_steps_count[-1]}")
-            del self.in_recovery[agent_id]
-            del self.recovery_steps[agent_id]
+        idx = agent_id - 1
+        if self.in_recovery[idx]:
+            steps = int(self.recovery_steps[idx])
+            self.recovery_steps_count.push(steps)
+            self.recovery_steps[idx] = 0  # Reset recovery steps for the next collision
+            if self.verbose:
+                print(f"Total recovery steps: {steps}")
+            self.in_recovery[idx] = False
 
     def record_overcapacity_attempt(self, agent_id, shelf_id, shelf_weight, agent_capacity):
         """Record when an agent attempts to carry a shelf that's too heavy"""
         self.overcapacity_attempts += 1
-        self.overcapacity_agents.add(agent_id)
+        self.overcapacity_agents[agent_id - 1] = True
         self.failed_deliveries += 1
         self.total_deliveries += 1
 
@@ -154,23 +211,23 @@ class MetricsTracker:
     def record_battery_failure(self, agent_id):
         """Record when an agent runs out of battery before reaching charger"""
         self.battery_failures += 1
-        self.discharged_agents.add(agent_id)
+        self.discharged_agents[agent_id - 1] = True
         self.failed_deliveries += 1
         self.total_deliveries += 1
 
     def record_charging_start(self, agent_id):
         """Record when an agent starts charging"""
-        self.charging_time[agent_id] = time.time()
-        self.charging_steps[agent_id] = 0  # Reset step counter
+        self.charging_time[agent_id] = self.step_time
+        self.charging_steps[agent_id - 1] = 0  # Reset step counter
         
     def record_charging_end(self, agent_id):
         """Record when an agent finishes charging"""
         if agent_id in self.charging_time:
             start_time = self.charging_time[agent_id]
-            duration = time.time() - start_time
+            duration = self.step_time - start_time
             self.charging_time[agent_id] = duration
-            self.charging_durations.append(duration)  # Store completed duration
-            self.charging_step_counts.append(self.charging_steps[agent_id]) 
+            self.charging_durations.push(duration)  # Store completed duration
+            self.charging_step_counts.push(self.charging_steps[agent_id - 1])
             del self.charging_time[agent_id]  # Remove from active charging
 
     def record_step_completion(self):
@@ -178,16 +235,23 @@ class MetricsTracker:
         current_time = time.time()
         self.last_step_time = current_time
         
-        # Update idle time for all agents
-        for agent_id, last_active in self.last_active_time.items():
-            idle_time = current_time - last_active
-            self.idle_time[agent_id] += idle_time
+        # Update idle time for every agent that has been active, in one array op
+        active = self.has_been_active
+        self.idle_time[active] += current_time - self.last_active_time[active]
+
+    def _task_means(self):
+        """Mean task duration and step count, recomputed only after new tasks complete"""
+        # Both buffers are append-only and grow together, so the sample count identifies the cache
+        n = len(self.task_durations)
+        if n != self._task_means_n:
+            self._task_means_cache = (self.task_durations.view().mean(), self.task_step_counts.view().mean())
+            self._task_means_n = n
+        return self._task_means_cache
 
     def get_metrics_summary(self):
         """Generate a comprehensive metrics summary"""
-        avg_task_duration = np.mean(self.task_durations) if self.task_durations else 0
-        avg_task_steps = np.mean(self.task_step_counts) if self.task_step_counts else 0
-        total_recovery_steps = sum(self.recovery_steps_count) if self.recovery_steps_count else 0
+        avg_task_duration, avg_task_steps = self._task_means()
+        total_recovery_steps = int(self.recovery_steps_count.view().sum())
         
         return {
             # Delivery metrics
@@ -210,28 +274,37 @@ class MetricsTracker:
         Returns:
             SimpleNamespace: Object with count, avg_duration, avg_steps, shelf_ids attributes
         """
+        avg_duration, avg_steps = self._task_means()
         return SimpleNamespace(
             count=self.successful_deliveries,
-            avg_duration=np.mean(self.task_durations) if self.task_durations else 0,
-            avg_steps=np.mean(self.task_step_counts) if self.task_step_counts else 0,
+            avg_duration=avg_duration,
+            avg_steps=avg_steps,
             shelf_ids=self.completed_shelves
         )
 
+    def format_summary(self):
+        """Return a formatted summary of all metrics as a string"""
+        metrics = self.get_metrics_summary()
+
+        lines = [
+            "",
+            "=== Performance Metrics Summary ===",
+            "",
+            "--- Delivery Metrics ---",
+            f"Total deliveries attempted: {metrics['total_deliveries']}",
+            "",
+            "--- Timing Metrics ---",
+            f"Total simulation time: {metrics['total_simulation_time']:.2f} seconds",
+            f"Average task duration: {metrics['average_task_duration']:.2f} seconds",
+            f"Average steps per task: {metrics['average_task_steps']:.1f}",
+            f"Total steps taken: {metrics['total_steps']}",
+            "",
+            "--- Movement Metrics ---",
+            f"Total collisions: {metrics['total_collisions']}",
+            f"Average recovery steps per collision: {metrics['average_recovery_steps']:.1f}",
+        ]
+        return "\n".join(lines) + "\n"
+
     def print_summary(self):
         """Print a formatted summary of all metrics"""
-        metrics = self.get_metrics_summary()
-        
-        print("\n=== Performance Metrics Summary ===")
-        print(f"\n--- Delivery Metrics ---")
-        print(f"Total deliveries attempted: {metrics['total_deliveries']}")
-        
-        print(f"\n--- Timing Metrics ---")
-        print(f"Total simulation time: {metrics['total_simulation_time']:.2f} seconds")
-        print(f"Average task duration: {metrics['average_task_duration']:.2f} seconds")
-        print(f"Average steps per task: {metrics['average_task_steps']:.1f}")
-        print(f"Total steps taken: {metrics['total_steps']}")
-        
-        print(f"\n--- Movement Metrics ---")
-        print(f"Total collisions: {metrics['total_collisions']}")
-        print(f"Average recovery steps per collision: {metrics['average_recovery_steps']:.1f}")
-        
\ No newline at end of file
+        print(self.format_summary(), end="")
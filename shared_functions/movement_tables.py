@@ -0,0 +1,21 @@
+from shared_functions.enums import Action
+
+_L, _R = Action.LEFT.value, Action.RIGHT.value
+
+# Per heading (UP=0, DOWN=1, LEFT=2, RIGHT=3): forward step, and heading after a LEFT/RIGHT turn
+STEP_X = (0, 0, -1, 1)
+STEP_Y = (-1, 1, 0, 0)
+TURN_LEFT = (2, 3, 1, 0)
+TURN_RIGHT = (3, 2, 0, 1)
+
+# Turn actions indexed by current_dir * 4 + desired_dir (UP=0, DOWN=1, LEFT=2, RIGHT=3)
+TURN_TABLE = (
+    (),       (_L, _L), (_L,),    (_R,),     # UP    -> UP, DOWN, LEFT, RIGHT
+    (_L, _L), (),       (_R,),    (_L,),     # DOWN  -> UP, DOWN, LEFT, RIGHT
+    (_R,),    (_L,),    (),       (_L, _L),  # LEFT  -> UP, DOWN, LEFT, RIGHT
+    (_L,),    (_R,),    (_L, _L), (),        # RIGHT -> UP, DOWN, LEFT, RIGHT
+)
+
+# Debug labels for headings and actions
+DIRECTION_NAMES = {0: 'UP', 1: 'DOWN', 2: 'LEFT', 3: 'RIGHT'}
+ACTION_NAMES = {0: 'NOOP', 1: 'FORWARD', 2: 'LEFT', 3: 'RIGHT', 4: 'TOGGLE_LOAD'}
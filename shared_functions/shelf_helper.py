@@ -1,6 +1,14 @@
 import numpy as np
+from shared_functions.enums import AgentState
 
 class ShelfHelper:
+    __slots__ = (
+        'env', 'grid_size', 'rows', 'cols', 'agent_states', 'shelf_memory',
+        'shelf_locations', 'obstacle_positions', 'obstacle_and_shelf_positions',
+        'obstacle_mask', 'obstacle_and_shelf_mask', 'shelf_release_cells',
+        '_agent_cells', '_agent_cells_step', '_agent_cells_source',
+    )
+
     def __init__(self, env, agent_states_ref=None):
         self.env = env.unwrapped
         self.grid_size = (int(self.env.grid_size[0]), int(self.env.grid_size[1]))
@@ -10,6 +18,18 @@ class ShelfHelper:
         self.shelf_memory = {}  # Track original shelf positions
         self._initialize_shelf_memory()
         self.shelf_locations = self._extract_shelf_locations()
+        self.obstacle_positions = self._extract_obstacle_positions()
+        # Shelf locations are fixed after init, so the shelf-blocking states share one (frozen) union
+        self.obstacle_and_shelf_positions = self.obstacle_positions | self.shelf_locations
+        # The same static layers as flat masks over packed cells (x * rows + y)
+        self.obstacle_mask = self._positions_to_mask(self.obstacle_positions)
+        self.obstacle_and_shelf_mask = self._positions_to_mask(self.obstacle_and_shelf_positions)
+        # Cell each shelf id frees when it is carried (its packed home cell, -1 if none or an obstacle)
+        self.shelf_release_cells = self._build_shelf_release_cells()
+        # Agent cells cached per env step (see _get_agent_cells)
+        self._agent_cells = None
+        self._agent_cells_step = None
+        self._agent_cells_source = None
 
     def _initialize_shelf_memory(self):
         """Store original shelf positions"""
@@ -18,47 +38,105 @@ class ShelfHelper:
 
     def _extract_shelf_locations(self):
         """Extract shelf positions directly from environment"""
-        shelf_locations = set()
-        for shelf in self.env.shelfs:
-            x = max(0, min(int(shelf.x), self.cols-1))
-            y = max(0, min(int(shelf.y), self.rows-1))
-            shelf_locations.add((x, y))
-        return shelf_locations
+        shelfs = self.env.shelfs
+        xs = np.fromiter((shelf.x for shelf in shelfs), dtype=np.int64, count=len(shelfs))
+        ys = np.fromiter((shelf.y for shelf in shelfs), dtype=np.int64, count=len(shelfs))
+        np.clip(xs, 0, self.cols - 1, out=xs)
+        np.clip(ys, 0, self.rows - 1, out=ys)
+        return frozenset(zip(xs.tolist(), ys.tolist()))
+
+    def _extract_obstacle_positions(self):
+        """Extract static obstacle positions (shared by every agent's search)"""
+        ys, xs = np.nonzero(self.env.obstacles)
+        return frozenset(zip(xs.tolist(), ys.tolist()))
 
     def get_blocked_positions(self, agent, shelf_width=1, shelf_height=1):
         """Get blocked positions based on agent state"""
-        blocked = set()
-
-        # Add obstacle positions
-        for y in range(self.env.obstacles.shape[0]):
-            for x in range(self.env.obstacles.shape[1]):
-                if self.env.obstacles[y, x]:
-                    blocked.add((x, y))
-        
-        # Always block other agents (regardless of state)
-        for other_agent in self.env.agents:
-            if other_agent != agent:
-                blocked.add((int(other_agent.x), int(other_agent.y)))
-
         # Get current state (with fallback for agents without state)
         current_state = getattr(agent, 'state', None) or \
                     (self.agent_states.get(agent.id) if self.agent_states else None)
 
+        # Obstacles and shelves never move, so start from a precomputed set.
         # Block shelves only in deliver or return_shelf states
-        if current_state in ["deliver", "return_shelf", "charging"]:
+        if current_state in [AgentState.DELIVER, AgentState.RETURN_SHELF, AgentState.CHARGING]:
+            blocked = set(self.obstacle_and_shelf_positions)
             if agent.carrying_shelf:
                 # Don't block the shelf we're carrying (for return_shelf)
                 carried_shelf_pos = self.shelf_memory.get(agent.carrying_shelf.id, (-1, -1))
-                for pos in self.shelf_locations:
-                    if pos != carried_shelf_pos:
-                        blocked.add(pos)
-            else:
-                # Block all shelves if not carrying (shouldn't happen in these states)
-                blocked.update(self.shelf_locations)
-        # In seek_shelf state, shelves are NOT blocked (agent can pass through them)
+                if carried_shelf_pos not in self.obstacle_positions:
+                    blocked.discard(carried_shelf_pos)
+            # (Block all shelves if not carrying - shouldn't happen in these states)
+        else:
+            # In seek_shelf state, shelves are NOT blocked (agent can pass through them)
+            blocked = set(self.obstacle_positions)
+        
+        # Always block other agents (regardless of state): add every agent, then restore our own cell
+        own_pos = (int(agent.x), int(agent.y))
+        own_blocked = own_pos in blocked
+        rows = self.rows
+        blocked.update(divmod(cell, rows) for cell in self._get_agent_cells())
+        if not own_blocked:
+            blocked.discard(own_pos)
 
         return blocked
 
+    def get_blocked_mask(self, agent):
+        """get_blocked_positions as a bytearray over packed cells (x * rows + y), 1 = blocked"""
+        current_state = getattr(agent, 'state', None) or \
+                    (self.agent_states.get(agent.id) if self.agent_states else None)
+        rows = self.rows
+
+        # Copy the static layer, then overlay the few cells that change each step
+        if current_state in [AgentState.DELIVER, AgentState.RETURN_SHELF, AgentState.CHARGING]:
+            mask = bytearray(self.obstacle_and_shelf_mask)
+            if agent.carrying_shelf:
+                # Don't block the shelf we're carrying (for return_shelf)
+                cell = self.shelf_release_cells[agent.carrying_shelf.id]
+                if cell >= 0:
+                    mask[cell] = 0
+        else:
+            mask = bytearray(self.obstacle_mask)
+
+        # Always block other agents (regardless of state): stamp every agent, then restore our own cell
+        own_cell = int(agent.x) * rows + int(agent.y)
+        own_value = mask[own_cell]
+        for cell in self._get_agent_cells():
+            mask[cell] = 1
+        mask[own_cell] = own_value
+
+        return mask
+
+    def _get_agent_cells(self):
+        """Packed cells of all agents, gathered once per env step and shared by every agent's mask"""
+        # Agents only move inside env.step() (which bumps _cur_steps) and reset() (which replaces the list)
+        agents = self.env.agents
+        step = self.env._cur_steps
+        if step != self._agent_cells_step or agents is not self._agent_cells_source:
+            rows = self.rows
+            self._agent_cells = [int(a.x) * rows + int(a.y) for a in agents]
+            self._agent_cells_step = step
+            self._agent_cells_source = agents
+        return self._agent_cells
+
+    def _build_shelf_release_cells(self):
+        """Packed home cell per shelf id from shelf_memory, skipping cells that stay blocked as obstacles"""
+        rows = self.rows
+        cells = [-1] * (max(self.shelf_memory, default=0) + 1)
+        for shelf_id, (x, y) in self.shelf_memory.items():
+            cell = x * rows + y
+            if not self.obstacle_mask[cell]:
+                cells[shelf_id] = cell
+        return cells
+
+    def _positions_to_mask(self, positions):
+        """Flag the in-bounds positions in a flat per-cell mask"""
+        rows = self.rows
+        mask = bytearray(self.cols * rows)
+        for x, y in positions:
+            if 0 <= x < self.cols and 0 <= y < rows:
+                mask[x * rows + y] = 1
+        return mask
+
     def get_shelf_memory(self):
         """Get the shelf memory dictionary"""
         return self.shelf_memory
@@ -73,15 +151,14 @@ class ShelfHelper:
         grid = np.full((self.rows, self.cols), '.', dtype='U1')
         
         # Mark shelves
-        for shelf_pos in self.shelf_locations:
-            x, y = shelf_pos
-            grid[y, x] = 'S'  # Note: y comes first in numpy arrays
+        if self.shelf_locations:
+            xs, ys = np.array(list(self.shelf_locations)).T
+            grid[ys, xs] = 'S'  # Note: y comes first in numpy arrays
         
-        # Mark blocked positions (including shelves when applicable)
-        blocked = self.get_blocked_positions(agent)
-        for (x, y) in blocked:
-            if grid[y, x] == '.':
-                grid[y, x] = 'X'  # Other blocked positions
+        # Mark blocked positions (including shelves when applicable); packed cells are x * rows + y
+        blocked = np.frombuffer(self.get_blocked_mask(agent), dtype=np.uint8)
+        blocked = blocked.reshape(self.cols, self.rows).T.astype(bool)
+        grid[blocked & (grid == '.')] = 'X'  # Other blocked positions
         
         # Mark agents
         for other_agent in self.env.agents:
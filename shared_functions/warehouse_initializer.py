@@ -1,7 +1,9 @@
 import numpy as np
+from collections import deque
 from enum import Enum
 import gymnasium as gym
 import rware
+from shared_functions.enums import AgentState
 
 class WarehouseInitializer:
     def __init__(self, env):
@@ -15,20 +17,15 @@ class WarehouseInitializer:
         self.shelf_memory = {}
 
         # Movement control components
-        self.agent_states = {}  # "seek_shelf", "deliver", "return_shelf"
+        self.agent_states = {}  # AgentState per agent
         self.shelf_memory = {}  # Remember original shelf positions
         self.agent_targets = {}  # Current target for each agent
         self.last_positions = {}
         self.stuck_count = {}
         self.last_actions = {}
         
-        # Direction mappings
-        self.direction_map = {
-            0: 'UP',
-            1: 'DOWN',
-            2: 'LEFT',
-            3: 'RIGHT'
-        }
+        # Direction mappings (direction_map is indexed by Direction.value)
+        self.direction_map = ('UP', 'DOWN', 'LEFT', 'RIGHT')
         self.direction_symbols = {
             'UP': '↑',
             'DOWN': '↓',
@@ -61,21 +58,23 @@ class WarehouseInitializer:
 
     def _initialize_goals(self):
         """Initialize and verify goal locations"""
-        self.goal_locations = set()
-        for g in self.env.goals:
-            x = max(0, min(int(g[0]), self.cols-1))
-            y = max(0, min(int(g[1]), self.rows-1))
-            self.goal_locations.add((x, y))
+        goals = self.env.goals
+        xs = np.fromiter((g[0] for g in goals), dtype=np.int64, count=len(goals))
+        ys = np.fromiter((g[1] for g in goals), dtype=np.int64, count=len(goals))
+        np.clip(xs, 0, self.cols - 1, out=xs)
+        np.clip(ys, 0, self.rows - 1, out=ys)
+        self.goal_locations = set(zip(xs.tolist(), ys.tolist()))
         
 
     def _initialize_shelves(self):
         """Initialize and verify shelf locations"""
-        self.shelf_locations = {}
-        for shelf in self.env.shelfs:
-            x = max(0, min(int(shelf.x), self.cols-1))
-            y = max(0, min(int(shelf.y), self.rows-1))
-            self.shelf_locations[shelf.id] = (x, y)
-            self.shelf_memory[shelf.id] = (x, y)  # Also store in memory for movement logic
+        shelfs = self.env.shelfs
+        xs = np.fromiter((shelf.x for shelf in shelfs), dtype=np.int64, count=len(shelfs))
+        ys = np.fromiter((shelf.y for shelf in shelfs), dtype=np.int64, count=len(shelfs))
+        np.clip(xs, 0, self.cols - 1, out=xs)
+        np.clip(ys, 0, self.rows - 1, out=ys)
+        self.shelf_locations = dict(zip((shelf.id for shelf in shelfs), zip(xs.tolist(), ys.tolist())))
+        self.shelf_memory.update(self.shelf_locations)  # Also store in memory for movement logic
         
         # print("\nShelf Locations:")
         # for shelf_id, (x, y) in self.shelf_locations.items():
@@ -87,15 +86,15 @@ class WarehouseInitializer:
         for agent in self.env.agents:
             agent.x = max(0, min(int(agent.x), self.cols-1))
             agent.y = max(0, min(int(agent.y), self.rows-1))
-            direction = self.direction_map.get(agent.dir.value, f'UNKNOWN({agent.dir.value})')
+            direction = self.direction_map[agent.dir.value]
             self.agent_locations[agent.id] = (agent.x, agent.y, direction)
             
             # Initialize movement control states
-            self.agent_states[agent.id] = "seek_shelf"
+            self.agent_states[agent.id] = AgentState.SEEK_SHELF
             self.agent_targets[agent.id] = None
             self.last_positions[agent.id] = (agent.x, agent.y)
             self.stuck_count[agent.id] = 0
-            self.last_actions[agent.id] = []
+            self.last_actions[agent.id] = deque()
         
         # print("\nAgent Locations:")
         # for agent_id, (x, y, dir) in self.agent_locations.items():